@@ -0,0 +1,439 @@
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+# Benchmark suite for interpret.py, every workload is a generated IPPcode19 program
+# in several sizes, the results are saved as JSON and compared with a baseline
+
+
+# Build XML source of the program from (opcode, (type, value), ...) instructions
+def generateXml(instructions):
+    root = ET.Element("program", language="IPPcode19")
+
+    for order, (opcode, *arguments) in enumerate(instructions, 1):
+        instruction = ET.SubElement(root, "instruction", order=str(order), opcode=opcode)
+        for number, (argType, value) in enumerate(arguments, 1):
+            argument = ET.SubElement(instruction, "arg{}".format(number), type=argType)
+            argument.text = value
+
+    return ET.tostring(root, encoding="unicode")
+
+
+# Return operands of the given types
+def var(name):
+    return ("var", name)
+
+def label(name):
+    return ("label", name)
+
+def integer(value):
+    return ("int", str(value))
+
+def string(value):
+    return ("string", value)
+
+
+# Tight integer loop: ADD, SUB and a conditional jump per iteration
+def generateLoop(size):
+    return [
+        ("DEFVAR", var("GF@i")),
+        ("DEFVAR", var("GF@sum")),
+        ("MOVE", var("GF@i"), integer(0)),
+        ("MOVE", var("GF@sum"), integer(0)),
+        ("LABEL", label("loop")),
+        ("ADD", var("GF@sum"), var("GF@sum"), var("GF@i")),
+        ("SUB", var("GF@sum"), var("GF@sum"), integer(1)),
+        ("ADD", var("GF@i"), var("GF@i"), integer(1)),
+        ("JUMPIFNEQ", label("loop"), var("GF@i"), integer(size)),
+        ("WRITE", var("GF@sum")),
+    ]
+
+
+# Deep recursion: CALL until the counter reaches zero, then RETURN all the way up
+def generateRecursion(size):
+    return [
+        ("DEFVAR", var("GF@n")),
+        ("MOVE", var("GF@n"), integer(size)),
+        ("CALL", label("rec")),
+        ("WRITE", var("GF@n")),
+        ("EXIT", integer(0)),
+        ("LABEL", label("rec")),
+        ("JUMPIFEQ", label("done"), var("GF@n"), integer(0)),
+        ("SUB", var("GF@n"), var("GF@n"), integer(1)),
+        ("CALL", label("rec")),
+        ("LABEL", label("done")),
+        ("RETURN",),
+    ]
+
+
+# String building: CONCAT a string of the given length, then rewrite it by GETCHAR/SETCHAR
+def generateStrings(size):
+    return [
+        ("DEFVAR", var("GF@s")),
+        ("DEFVAR", var("GF@i")),
+        ("DEFVAR", var("GF@c")),
+        ("MOVE", var("GF@s"), string("")),
+        ("MOVE", var("GF@i"), integer(0)),
+        ("LABEL", label("build")),
+        ("CONCAT", var("GF@s"), var("GF@s"), string("a")),
+        ("ADD", var("GF@i"), var("GF@i"), integer(1)),
+        ("JUMPIFNEQ", label("build"), var("GF@i"), integer(size)),
+        ("MOVE", var("GF@i"), integer(0)),
+        ("LABEL", label("rewrite")),
+        ("GETCHAR", var("GF@c"), var("GF@s"), var("GF@i")),
+        ("SETCHAR", var("GF@s"), var("GF@i"), string("b")),
+        ("ADD", var("GF@i"), var("GF@i"), integer(1)),
+        ("JUMPIFNEQ", label("rewrite"), var("GF@i"), integer(size)),
+        ("STRLEN", var("GF@i"), var("GF@s")),
+        ("WRITE", var("GF@i")),
+    ]
+
+
+# Append then read: every CONCAT into the string is followed by reads of the whole value
+def generateAppendRead(size):
+    return [
+        ("DEFVAR", var("GF@s")),
+        ("DEFVAR", var("GF@t")),
+        ("DEFVAR", var("GF@i")),
+        ("MOVE", var("GF@s"), string("")),
+        ("MOVE", var("GF@i"), integer(0)),
+        ("LABEL", label("loop")),
+        ("CONCAT", var("GF@s"), var("GF@s"), string("a")),
+        ("JUMPIFEQ", label("end"), var("GF@s"), string("b")),
+        ("PUSHS", var("GF@s")),
+        ("POPS", var("GF@t")),
+        ("ADD", var("GF@i"), var("GF@i"), integer(1)),
+        ("JUMPIFNEQ", label("loop"), var("GF@i"), integer(size)),
+        ("LABEL", label("end")),
+        ("STRLEN", var("GF@i"), var("GF@t")),
+        ("WRITE", var("GF@i")),
+    ]
+
+
+# Data stack churn: the loop counter lives on the data stack
+def generateStack(size):
+    return [
+        ("DEFVAR", var("GF@i")),
+        ("MOVE", var("GF@i"), integer(0)),
+        ("LABEL", label("loop")),
+        ("PUSHS", var("GF@i")),
+        ("PUSHS", integer(1)),
+        ("ADDS",),
+        ("POPS", var("GF@i")),
+        ("PUSHS", var("GF@i")),
+        ("PUSHS", integer(size)),
+        ("JUMPIFNEQS", label("loop")),
+        ("WRITE", var("GF@i")),
+    ]
+
+
+# Frame storm: every iteration creates, pushes and pops a frame with a few variables
+def generateFrames(size):
+    return [
+        ("DEFVAR", var("GF@i")),
+        ("MOVE", var("GF@i"), integer(0)),
+        ("LABEL", label("loop")),
+        ("CREATEFRAME",),
+        ("DEFVAR", var("TF@a")),
+        ("DEFVAR", var("TF@b")),
+        ("MOVE", var("TF@a"), var("GF@i")),
+        ("PUSHFRAME",),
+        ("ADD", var("LF@a"), var("LF@a"), integer(1)),
+        ("MOVE", var("GF@i"), var("LF@a")),
+        ("CREATEFRAME",),
+        ("POPFRAME",),
+        ("JUMPIFNEQ", label("loop"), var("GF@i"), integer(size)),
+        ("WRITE", var("GF@i")),
+    ]
+
+
+# Straight-line program of the given number of instructions which exits at once, so only
+# loading and validation is measured, the operands repeat as in generated code
+def generateValidation(size):
+    body = [
+        lambda index: ("MOVE", var("GF@a"), integer(index % 1000)),
+        lambda index: ("ADD", var("GF@a"), var("GF@a"), integer(1)),
+        lambda index: ("CONCAT", var("GF@s"), string("ab\\032c"), string("x{}".format(index % 100))),
+        lambda index: ("JUMPIFEQ", label("end"), var("GF@a"), ("nil", "nil")),
+        lambda index: ("PUSHS", ("bool", "true")),
+        lambda index: ("POPS", var("LF@b")),
+    ]
+
+    instructions = [("EXIT", integer(0)), ("LABEL", label("end"))]
+    for index in range(size - len(instructions)):
+        instructions.append(body[index % len(body)](index))
+
+    return instructions
+
+
+# Return workload name => (generator, {size name: size})
+def getWorkloads():
+    return {
+        "loop": (generateLoop, {"small": 10000, "medium": 100000, "large": 1000000}),
+        "recursion": (generateRecursion, {"small": 1000, "medium": 10000, "large": 100000}),
+        "strings": (generateStrings, {"small": 1000, "medium": 10000, "large": 50000}),
+        "appendread": (generateAppendRead, {"small": 1000, "medium": 10000, "large": 40000}),
+        "stack": (generateStack, {"small": 10000, "medium": 100000, "large": 500000}),
+        "frames": (generateFrames, {"small": 10000, "medium": 50000, "large": 200000}),
+    }
+
+
+# Run the interpreter once, return wall time, peak RSS in kB, the executed instruction count
+# and the time of loading and execution reported by the interpreter
+def runInterpreter(interpreter, sourceFile, extraArgs, statsFile):
+    command = [sys.executable, interpreter, "--source=" + sourceFile, "--input=" + os.devnull]
+    command = command + extraArgs + ["--stats=" + statsFile, "--insts", "--time"]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # stderr is read to its end first, a full pipe would block the interpreter,
+    # wait4 then gives the resource usage of this process only, not of all children
+    errors = process.stderr.read().decode(errors="replace")
+    process.stderr.close()
+    pid, status, usage = os.wait4(process.pid, 0)
+    wallTime = time.perf_counter() - start
+
+    returnCode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if returnCode != 0:
+        sys.exit("ERROR: {} failed with exit code {}: {}".format(sourceFile, returnCode, errors.strip()))
+
+    with open(statsFile) as f:
+        executed = int(f.readline())
+        executionTime = float(f.readline())
+
+    return wallTime, usage.ru_maxrss, executed, executionTime
+
+
+# Run a program repeatedly, return the median wall time, the peak RSS, the executed
+# instruction count and the median time of loading and execution
+def measure(interpreter, sourceFile, extraArgs, statsFile, repeat):
+    runs = [runInterpreter(interpreter, sourceFile, extraArgs, statsFile) for run in range(repeat)]
+
+    wallTime = statistics.median(run[0] for run in runs)
+    peakRss = max(run[1] for run in runs)
+    executionTime = statistics.median(run[3] for run in runs)
+
+    return wallTime, peakRss, runs[0][2], executionTime
+
+
+# Run the selected workloads, return the results keyed by "workload/size",
+# results executed in less than the noise floor in seconds are not reliable
+def runBenchmarks(interpreter, workloads, sizes, extraArgs, repeat, noiseFloor, workDir):
+    statsFile = os.path.join(workDir, "stats")
+
+    emptyFile = os.path.join(workDir, "empty.xml")
+    with open(emptyFile, "w") as f:
+        f.write(generateXml([]))
+
+    startupTime, startupRss, executed, executionTime = measure(interpreter, emptyFile, extraArgs, statsFile, repeat)
+    print("{:<20}{:>12.3f} s{:>12} kB".format("startup", startupTime, startupRss), file=sys.stderr)
+
+    results = {}
+    for name, (generator, workloadSizes) in sorted(getWorkloads().items()):
+        if workloads and name not in workloads:
+            continue
+
+        for sizeName in sizes:
+            sourceFile = os.path.join(workDir, "{}-{}.xml".format(name, sizeName))
+            with open(sourceFile, "w") as f:
+                f.write(generateXml(generator(workloadSizes[sizeName])))
+
+            # the interpreter measures the execution itself, its startup is not part of the speed
+            wallTime, peakRss, executed, executionTime = measure(interpreter, sourceFile, extraArgs, statsFile, repeat)
+
+            key = "{}/{}".format(name, sizeName)
+            results[key] = {"instructions": executed, "wallTime": wallTime, "executionTime": executionTime,
+                            "instructionsPerSecond": executed / executionTime, "peakRss": peakRss,
+                            "reliable": executionTime >= noiseFloor}
+
+            print("{:<20}{:>12.3f} s{:>12} kB{:>14.0f} instr/s".format(
+                key, wallTime, peakRss, results[key]["instructionsPerSecond"]), file=sys.stderr)
+
+    return {"python": sys.version, "interpreterArgs": extraArgs, "repeat": repeat,
+            "startup": {"wallTime": startupTime, "peakRss": startupRss}, "benchmarks": results}
+
+
+# Load the validation programs, return the results keyed by "validation/size",
+# the rate is the number of loaded instructions per second
+def runValidation(interpreter, sizes, extraArgs, repeat, noiseFloor, workDir):
+    statsFile = os.path.join(workDir, "stats")
+
+    emptyFile = os.path.join(workDir, "empty.xml")
+    with open(emptyFile, "w") as f:
+        f.write(generateXml([]))
+
+    startupTime, startupRss, executed, executionTime = measure(interpreter, emptyFile, extraArgs, statsFile, repeat)
+    print("{:<20}{:>12.3f} s{:>12} kB".format("startup", startupTime, startupRss), file=sys.stderr)
+
+    validationSizes = {"small": 10000, "medium": 100000, "large": 1000000}
+    results = {}
+    for sizeName in sizes:
+        sourceFile = os.path.join(workDir, "validation-{}.xml".format(sizeName))
+        with open(sourceFile, "w") as f:
+            f.write(generateXml(generateValidation(validationSizes[sizeName])))
+
+        # the program exits at once, the time reported by the interpreter is the loading
+        wallTime, peakRss, executed, loadTime = measure(interpreter, sourceFile, extraArgs, statsFile, repeat)
+
+        key = "validation/{}".format(sizeName)
+        results[key] = {"instructions": validationSizes[sizeName], "wallTime": wallTime, "loadTime": loadTime,
+                        "instructionsPerSecond": validationSizes[sizeName] / loadTime, "peakRss": peakRss,
+                        "reliable": loadTime >= noiseFloor}
+
+        print("{:<20}{:>12.3f} s{:>12} kB{:>14.0f} instr/s".format(
+            key, wallTime, peakRss, results[key]["instructionsPerSecond"]), file=sys.stderr)
+
+    return {"python": sys.version, "interpreterArgs": extraArgs, "repeat": repeat,
+            "startup": {"wallTime": startupTime, "peakRss": startupRss}, "benchmarks": results}
+
+
+# Return the fastest wall time of the command
+def measureCommand(command, repeat):
+    wallTimes = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wallTimes.append(time.perf_counter() - start)
+
+    return min(wallTimes)
+
+
+# Measure the startup on an empty program: wall time to exit compared with bare Python,
+# time to compile the interpreter source and the slowest imports by python -X importtime
+def measureStartup(interpreter, extraArgs, repeat, workDir):
+    emptyFile = os.path.join(workDir, "empty.xml")
+    with open(emptyFile, "w") as f:
+        f.write(generateXml([]))
+
+    command = [sys.executable, interpreter, "--source=" + emptyFile, "--input=" + os.devnull] + extraArgs
+    wallTime = measureCommand(command, repeat)
+    pythonTime = measureCommand([sys.executable, "-c", "pass"], repeat)
+
+    # the script run as __main__ is compiled on every start, it is never cached
+    with open(interpreter, "rb") as f:
+        source = f.read()
+    start = time.perf_counter()
+    compile(source, interpreter, "exec")
+    compileTime = time.perf_counter() - start
+
+    # lines "import time: self [us] | cumulative | name", the top level imports are not indented
+    result = subprocess.run([sys.executable, "-X", "importtime"] + command[1:],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    imports = []
+    for line in result.stderr.decode(errors="replace").splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith("  "):
+            imports.append({"module": fields[2].strip(), "cumulative": int(fields[1]) / 1000000})
+    imports.sort(key=lambda entry: -entry["cumulative"])
+
+    return {"wallTime": wallTime, "python": pythonTime, "overhead": wallTime - pythonTime,
+            "compile": compileTime, "imports": imports[:10]}
+
+
+# Print the startup measurement
+def printStartup(startup, budget):
+    print("{:<20}{:>10.1f} ms".format("wall time", startup["wallTime"] * 1000))
+    print("{:<20}{:>10.1f} ms".format("bare python", startup["python"] * 1000))
+    print("{:<20}{:>10.1f} ms  (budget {:.1f} ms)".format("overhead", startup["overhead"] * 1000, budget))
+    print("{:<20}{:>10.1f} ms".format("compile", startup["compile"] * 1000))
+    print("\nslowest imports:")
+    for entry in startup["imports"]:
+        print("  {:<30}{:>8.1f} ms".format(entry["module"], entry["cumulative"] * 1000))
+
+
+# Compare the results with a baseline, return the list of regressions,
+# results below the noise floor in either run are shown but not compared
+def compareResults(results, baseline, threshold):
+    regressions = []
+
+    print("\n{:<20}{:>16}{:>16}{:>10}".format("BENCHMARK", "BASELINE", "CURRENT", "CHANGE"))
+
+    pairs = [("startup", baseline["startup"]["wallTime"], results["startup"]["wallTime"], False, True)]
+    for key in sorted(results["benchmarks"]):
+        if key in baseline["benchmarks"]:
+            old = baseline["benchmarks"][key]
+            new = results["benchmarks"][key]
+            pairs.append((key, old["instructionsPerSecond"], new["instructionsPerSecond"], True,
+                          old.get("reliable", True) and new["reliable"]))
+
+    for key, old, new, higherIsBetter, reliable in pairs:
+        # positive change is always an improvement
+        change = (new - old) / old * 100 if higherIsBetter else (old - new) / old * 100
+        flag = ""
+        if not reliable:
+            flag = "  BELOW NOISE FLOOR"
+        elif change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+
+        print("{:<20}{:>16.3f}{:>16.3f}{:>9.1f}%{}".format(key, old, new, change, flag))
+
+    return regressions
+
+
+def main():
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description = "Benchmark suite for interpret.py")
+    parser.add_argument('--interpreter', help = "Interpreter to benchmark", default = os.path.join(scriptDir, "interpret.py"))
+    parser.add_argument('--workload', help = "Run only the given workload, can repeat", action = "append",
+                        choices = sorted(getWorkloads()))
+    parser.add_argument('--size', help = "Run only the given size, can repeat", action = "append",
+                        choices = ["small", "medium", "large"])
+    parser.add_argument('--repeat', help = "Runs of every program, the median counts", type = int, default = 3)
+    parser.add_argument('--interpreter-args', help = "Extra arguments of the interpreter", default = "")
+    parser.add_argument('--output', help = "Save the results as JSON to the file")
+    parser.add_argument('--baseline', help = "Compare the results with JSON saved by --output")
+    parser.add_argument('--threshold', help = "Slowdown in percent reported as regression", type = float, default = 10)
+    parser.add_argument('--noise-floor', help = "Execution time in ms below which results are not compared",
+                        type = float, default = 20)
+    parser.add_argument('--startup', help = "Measure only the startup on an empty program", action = "store_true")
+    parser.add_argument('--startup-budget', help = "Startup overhead over bare Python in ms, exceeding it fails",
+                        type = float, default = 70)
+    parser.add_argument('--validation', help = "Measure only loading and validation of large programs",
+                        action = "store_true")
+    args = parser.parse_args()
+
+    if args.startup:
+        with tempfile.TemporaryDirectory() as workDir:
+            startup = measureStartup(args.interpreter, args.interpreter_args.split(), max(args.repeat, 10), workDir)
+
+        printStartup(startup, args.startup_budget)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(startup, f, indent=2)
+
+        if startup["overhead"] * 1000 > args.startup_budget:
+            sys.exit(1)
+        return
+
+    sizes = args.size or ["small", "medium", "large"]
+
+    with tempfile.TemporaryDirectory() as workDir:
+        if args.validation:
+            results = runValidation(args.interpreter, sizes, args.interpreter_args.split(), args.repeat,
+                                    args.noise_floor / 1000, workDir)
+        else:
+            results = runBenchmarks(args.interpreter, args.workload, sizes, args.interpreter_args.split(),
+                                    args.repeat, args.noise_floor / 1000, workDir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if compareResults(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
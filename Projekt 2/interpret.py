@@ -1,44 +1,166 @@
 import sys
-import argparse
-import numbers
-import re
-import copy
 import operator
+import os
+import io
 import xml.etree.ElementTree as ET
 
-# Class for frames and methods for frames
+# Modules used only by some features (argparse, re, hashlib, marshal, json, time,
+# signal, socketserver, traceback) are imported where they are used to keep startup short
+
+# Class for the nil value, nil is its only instance
+class Nil:
+    def __repr__(self):
+        return "nil"
+
+nil = Nil()
+
+# Marks a variable slot which was not defined by DEFVAR
+undefined = object()
+
+# Operand kind of literals, variables use the frame index into Context.frames
+CONST = 3
+
+# Class for a string built by CONCAT into the same variable or changed by SETCHAR,
+# appended parts are kept as chunks and SETCHAR works on a list of characters, so
+# neither copies the string, a read of the whole value joins them into one str once
+# A buffer belongs to one variable, every other reader gets the str
+class StringBuffer:
+    def __init__(self, string):
+        self.chunks = [string]
+        self.chars = None
+        self.length = len(string)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if self.chars is not None:
+            return self.chars[index]
+        return self.toString()[index]
+
+    def append(self, string):
+        if self.chars is not None:
+            self.toString()
+        self.chunks.append(string)
+        self.length += len(string)
+
+    def setChar(self, index, char):
+        if self.chars is None:
+            self.chars = list(self.toString())
+        self.chars[index] = char
+
+    def toString(self):
+        if self.chars is not None:
+            self.chunks = ["".join(self.chars)]
+            self.chars = None
+        elif len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0]
+
+# Variables of LF and TF by slot, a frame holds only the variables it defines
+class LocalVariables(dict):
+    def __missing__(self, slot):
+        return undefined
+
+# Class for frames and methods for frames, variables are stored in slots
+# resolved at load time, None marks a defined but not initialized variable,
+# initialized counts the variables holding a value
+# GF has a list of all its slots, LF and TF start empty and grow by DEFVAR
+# A frame is moved between TF, the frame stack and LF, it is never copied
 class Frames:
-    init = False
-    variables = {}
+    def __init__(self, size=None):
+        self.init = False
+        self.variables = LocalVariables() if size is None else [undefined] * size
+        self.initialized = 0
 
-    def append(self, varName, init, type, value):
+    def append(self, slot):
         if self.init:
-            self.variables[varName] = {"init": init,
-                                        "type": type,
-                                        "value": value}
+            value = self.variables[slot]
+            if value is not None and value is not undefined:
+                self.initialized -= 1
+            self.variables[slot] = None
         else:
             terminate("Frame not initialized!", 55)
 
-    def clearFrame(self):
-        self.variables.clear()
 
-# Class for stack and methods for stack
-class Stack:
-    stack = []
+# Class for reading the program input, the stream is read in large blocks
+# and split into lines lazily as READ consumes them
+class InputReader:
+    def __init__(self, stream, blockSize=65536):
+        self.stream = stream
+        self.blockSize = blockSize
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    # Return next line without the newline, None at the end of input
+    def readLine(self):
+        searchFrom = self.position
+        while True:
+            end = self.buffer.find("\n", searchFrom)
+            if end != -1:
+                line = self.buffer[self.position:end]
+                self.position = end + 1
+                return line
+
+            if self.eof:
+                break
+
+            # keep the unfinished line, continue searching in the new block
+            block = self.stream.read(self.blockSize)
+            if not block:
+                self.eof = True
+
+            self.buffer = self.buffer[self.position:] + block
+            searchFrom = len(self.buffer) - len(block)
+            self.position = 0
+
+        if self.position < len(self.buffer):
+            line = self.buffer[self.position:]
+            self.position = len(self.buffer)
+            return line
+
+        return None
+
+
+# Class for buffering the program output, the buffer is written out when it is
+# full and at the flush points (EXIT, end of program, errors, DPRINT, BREAK)
+class OutputWriter:
+    def __init__(self, stream, bufferSize):
+        self.stream = stream
+        self.bufferSize = bufferSize
+        self.parts = []
+        self.size = 0
 
-    def push(self, frame):
-        self.stack.insert(0, frame)
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.bufferSize:
+            self.flush()
 
-    def pop(self):
-        del self.stack[0]
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts.clear()
+            self.size = 0
 
-    def top(self):
-        return self.stack[0]
+        self.stream.flush()
+
+
+# Opcode tables and regular expressions, built on the first use and shared by later calls
+instructionTable = None
+opcodeIdTable = None
+signatureTable = None
+patternTable = None
 
 
 # List of avalaible instruction
 def getInstructionList():
-    instructionList = {
+    global instructionTable
+    if instructionTable is not None:
+        return instructionTable
+
+    instructionTable = {
         # Frames, function calls
         "move": {"var": [], "symb1": ["int", "bool", "string"]},
         "createframe": {},
@@ -88,25 +210,88 @@ def getInstructionList():
 
         # Debug
         "dprint": {"symb1": ["int", "bool", "string"]},
-        "break": {}
+        "break": {},
+
+        # STACK extension
+        "clears": {},
+        "adds": {},
+        "subs": {},
+        "muls": {},
+        "idivs": {},
+        "lts": {},
+        "gts": {},
+        "eqs": {},
+        "ands": {},
+        "ors": {},
+        "nots": {},
+        "int2chars": {},
+        "stri2ints": {},
+        "jumpifeqs": {"label": []},
+        "jumpifneqs": {"label": []}
     }
 
-    return instructionList
+    return instructionTable
+
+
+# List of superinstructions, their opcode ids follow the ids of getInstructionList
+def getSuperinstructionList():
+    return ["addjump", "subjump", "ltjump", "gtjump", "eqjump", "getcharjump"]
+
+
+# List of specialized instructions, their opcode ids follow the ids of getSuperinstructionList
+def getSpecializedList():
+    return ["typedoperation", "typednot", "typedbranch", "typedoperationjump", "typedcomparejump"]
+
+
+# Return opcode name => opcode id for instructions, superinstructions and specialized instructions
+def getOpcodeIds():
+    global opcodeIdTable
+    if opcodeIdTable is None:
+        opcodes = list(getInstructionList()) + getSuperinstructionList() + getSpecializedList()
+        opcodeIdTable = {name: opcodeId for opcodeId, name in enumerate(opcodes)}
+
+    return opcodeIdTable
+
+
+# Return opcode name => operand kinds derived from getInstructionList, a kind is "var",
+# "label", "type" or the tuple of literal types a symbol accepts
+def getSignatures():
+    global signatureTable
+    if signatureTable is None:
+        signatureTable = {}
+        for opcode, operands in getInstructionList().items():
+            signatureTable[opcode] = tuple(tuple(dataTypes) if kind.startswith("symb") else kind
+                                           for kind, dataTypes in operands.items())
+
+    return signatureTable
+
+
+# Return the compiled regular expressions
+def getPatterns():
+    global patternTable
+    if patternTable is None:
+        import re
+        patternTable = {
+            "wrongEscape": re.compile(r"(?!\\[0-9]{3})[\s\\#]"),
+            "escape": re.compile(r"\\([0-9]{3})"),
+        }
+
+    return patternTable
 
 
 # print error msg to stderr, exit with the proper error code
 def terminate(errorMessage, errorCode):
+    sys.stdout.flush()
     print("ERROR: {}".format(errorMessage), file=sys.stderr)
     sys.exit(errorCode)
 
 
 # inspect root format
-def checkRoot(root):
-    if root.tag != "program":
+def checkRoot(tag, attributes):
+    if tag != "program":
         terminate("Wrong XML root format!", 31)
 
-    rootItems = root.items()
-    for item in rootItems:
+    for item in attributes.items():
         attribute = item[0]
         attrText = item[1]
 
@@ -116,967 +301,2650 @@ def checkRoot(root):
             terminate("Wrong XML root format!", 31)
 
 
-# Check instruction attribute format
+# Check instruction attribute format, return the order number
 def checkInstructionAttributes(attributes):
-    if len(attributes) != 2 or len(attributes[0]) != 2 or len(attributes[1]) != 2:
+    if len(attributes) != 2:
         terminate("Incorrect instruction attribute count!", 31)
 
-    attrOrder = attributes[0][0]
-    attrNumber = attributes[0][1]
+    attrOrder, attrNumber = attributes[0]
     attrOpcode = attributes[1][0]
 
+    if attrOrder != "order" or attrOpcode != "opcode":
+        terminate("Wrong instruction attribute!", 31)
+
+    # plain numbers are the usual case, anything else is read as float like before
+    if len(attrNumber) < 16 and attrNumber.isdecimal():
+        return int(attrNumber)
+
     try:
         attrNumber = float(attrNumber)
     except:
         terminate("Wrong instruction order number!", 31)
 
-    if attrOrder != "order" or not attrNumber.is_integer() or attrOpcode != "opcode":
+    if not attrNumber.is_integer():
         terminate("Wrong instruction attribute!", 31)
 
+    return int(attrNumber)
 
 
-# Sort instructions by order number
+# Sort (opcode id, operands, order number) records by order number
 def sortInstructions(instructions):
-    insToSort = []
-    for i in instructions:
-        key = i.items()[0][1]
-        insToSort.append((key, i))
+    instructions.sort(key=lambda instruction: instruction[2])
 
-    try:
-        insToSort.sort()
-    except:
-        terminate("Wrong order number!", 32)
+    for index in range(1, len(instructions)):
+        if instructions[index - 1][2] == instructions[index][2]:
+            terminate("Wrong order number!", 32)
 
-    instructions[:] = [item[-1] for item in insToSort]
     return instructions
 
 
-# Check argument attribute format
-def checkArgumentAttributes(arguments):
-    for arg in arguments:
-        argNumber = arg.tag
-        if len(argNumber) < 4:
-            terminate("Wrong argument attribute format!", 31)
+# Check argument attribute format, arguments are (tag, attributes, text),
+# return (tag, type, text) of the arguments
+# Valid tags are remembered in tags, the number of a tag is checked once
+def checkArgumentAttributes(arguments, tags):
+    tokens = []
+    for argTag, attributes, argValue in arguments:
+        argNumber = argTag
+        if argNumber not in tags:
+            if len(argNumber) < 4 or argNumber[:3] != "arg":
+                terminate("Wrong argument attribute format!", 31)
 
-        argFormat = argNumber[:3]
-        argNumber = argNumber[3:]
-        try:
-            argNumber = float(argNumber)
-        except:
-            terminate("Wrong argument number!", 31)
+            try:
+                argNumber = float(argNumber[3:])
+            except:
+                terminate("Wrong argument number!", 31)
+
+            if not argNumber.is_integer():
+                terminate("Wrong argument attribute!", 31)
 
-        if argFormat != "arg" or not argNumber.is_integer() or arg.keys()[0] != "type":
+            tags.add(argTag)
+
+        argType = next(iter(attributes.items()), (None, None))
+        if argType[0] != "type":
             terminate("Wrong argument attribute!", 31)
-        
 
-# Sort arguments 
-def sortArguments(arguments):
-    argsToSort = []
-    for arg in arguments:
-        key = arg.tag
-        argsToSort.append((key, arg))
+        tokens.append((argTag, argType[1], argValue))
 
-    try:
-        argsToSort.sort()
-    except:
-        terminate("Wrong argument order number!", 32)
+    return tokens
 
-    arguments[:] = [item[-1] for item in argsToSort]
-    return arguments
 
+# Sort arguments by their tags, return their (type, text)
+def sortArguments(tokens):
+    if len(tokens) > 1:
+        tokens.sort(key=operator.itemgetter(0))
 
-# Check string format
-def checkString(string, isVarOrLabel):
-    if isVarOrLabel and string[0].isdigit():
-        terminate("Variables and labels can not start with numbers!", 32)
+        for index in range(1, len(tokens)):
+            if tokens[index - 1][0] == tokens[index][0]:
+                terminate("Wrong argument order number!", 32)
+
+    return tuple(token[1:] for token in tokens)
 
-    
-    #regexSpecial = re.search(r"^([a-zA-Z]|[_\-$&%*@!?])([\w_\-$&%*@!?])*$", string)
 
-    #if string != stringWithoutSpecial and isVarOrLabel:
-        #terminate("Using denied characters in variables or labels!", 32)
+# Check format of a variable or label name
+def checkName(string):
+    if not string or string[0].isdigit():
+        terminate("Variables and labels can not start with numbers!", 32)
 
-    regex = re.search(r"(?!\\[0-9]{3})[\s\\#]", string)                     
-    if regex is not None: 
+    if getPatterns()["wrongEscape"].search(string) is not None:
         terminate("Wrong escape sequence format!", 32)
 
 
-# Check label format
-def checkLabel(string):
-    if string.find('@') != -1:
-        terminate("Wrong label format!", 32)
+# Check the literal of a symbol, listDataTypes are the types the operand accepts
+def checkLiteral(listDataTypes, argType, argValue):
+    if argType == "nil":
+        if argValue != "nil":
+            terminate("Wrong nil format!", 32)
+        return
 
-    if isinstance(string, str):
-        checkString(string, True)
-    else:
-        terminate("Wrong label format!", 32)
+    if argType != "int" and argType != "string" and argType != "bool":
+        terminate("Wrong symbol format!", 32)
 
+    if argType not in listDataTypes:
+        terminate("Argument does not match!", 32)
 
-# Process variable
-def processTypeVar(argValue):
-    frameVar = argValue.partition("@")
-    if frameVar[1] != "@":
-            terminate("Wrong frame format!", 32)
-    if frameVar[0] != "GF" and frameVar[0] != "LF" and frameVar[0] != "TF":
-            terminate("Wrong frame format!", 32)
+    if argType == "int" and argValue:
+        try:
+            argValue = float(argValue)
+        except:
+            terminate("Argument value is not an integer!", 32)
 
-    checkString(frameVar[2], True)
-    return frameVar
+        if not argValue.is_integer():
+            terminate("Wrong integer format!", 32)
 
+    elif argType == "string" and argValue:
+        if getPatterns()["wrongEscape"].search(argValue) is not None:
+            terminate("Wrong escape sequence format!", 32)
 
+    elif argType == "bool" and argValue != "true" and argValue != "false":
+        terminate("Wrong bool argument format!", 32)
 
-# Check data types
-def checkTypeSymb(listArgType, listDataTypes, argType, argValue):
-    match = False
-    if argType == "var":
-        processTypeVar(argValue)
-        match = True
-
-    elif argType == "int":
-        for type in listDataTypes:
-            if type == argType:
-                match = True
-                            
-            if match and argValue:
-                try:
-                    argValue = float(argValue)
-                except:
-                    terminate("Argument value is not an integer!", 32)
-                
-                if not argValue.is_integer():
-                    terminate("Wrong integer format!", 32)
 
-                break
+# Validate one argument against the operand kind of the signature and decode it
+# var => (frame index, slot), other types => (CONST, value)
+def decodeOperand(kind, argType, argValue, slots):
+    if type(kind) is str:
+        if argType != kind:
+            terminate("Wrong attribute type!", 32)
 
+    elif argType != "var":
+        checkLiteral(kind, argType, argValue)
+        return (CONST, convertLiteral(argType, argValue or ""))
 
-    elif argType == "string":
-        for type in listDataTypes:
-            if type == argType:
-                match = True
+    if argType == "var":
+        frameVar = (argValue or "").partition("@")
+        if frameVar[0] != "GF" and frameVar[0] != "LF" and frameVar[0] != "TF":
+            terminate("Wrong frame format!", 32)
 
-            if match and argValue:
-                checkString(argValue, False)
-            
-                break
+        checkName(frameVar[2])
+        return getSlot(slots, frameVar[0], frameVar[2])
 
-    elif argType == "bool":
-        for type in listDataTypes:
-            if type == argType:
-                if argValue == "true" or argValue == "false":
-                    match = True
-                else:
-                    terminate("Wrong bool argument format!", 32)
-
-            if match:
-                break
+    if argType == "label":
+        if argValue is None or "@" in argValue:
+            terminate("Wrong label format!", 32)
 
-    elif argType == "nil":
-        match = True
-        if argValue != "nil":
-            terminate("Wrong nil format!", 32)
+        checkName(argValue)
+        return (CONST, argValue)
 
-    else:
-        terminate("Wrong symbol format!", 32)
+    if argType == "type":
+        if argValue != "int" and argValue != "string" and argValue != "bool" and argValue != "nil":
+            terminate("Wrong type format!", 32)
 
-    if not match:
-        terminate("Argument does not match!", 32)
+    return (CONST, argValue)
 
 
-# Analyze arguments
-def processArguments(listArgType, listDataTypes, argType, argValue):
-    if listArgType == "var":
-        if listArgType != argType:
-            terminate("Wrong attribute type!", 32)
+# Validate the arguments against the signature of the instruction and decode them
+# into operand tuples, cache is (argument lists, tokens) => operands
+# Instructions with the same signature and argument text share one operand tuple,
+# a token repeated in other argument lists is validated and converted once
+def decodeArguments(signature, tokens, slots, cache):
+    arguments, operands = cache
+    key = (signature, tokens)
+    if key in arguments:
+        return arguments[key]
 
-        processTypeVar(argValue)
-            
-    elif listArgType == "symb1" or listArgType == "symb2":
-        checkTypeSymb(listArgType, listDataTypes, argType, argValue)
+    if len(signature) != len(tokens):
+        terminate("Incorrect number of arguments!", 32)
 
-    elif listArgType == "label":
-        if listArgType != argType:
-            terminate("Wrong attribute type!", 32)
-        
-        checkLabel(argValue)
+    decoded = []
+    for kind, (argType, argValue) in zip(signature, tokens):
+        token = (kind, argType, argValue)
+        if token not in operands:
+            operands[token] = decodeOperand(kind, argType, argValue, slots)
+        decoded.append(operands[token])
 
-    elif listArgType == "type":
-        if listArgType != argType:
-            terminate("Wrong attribute type!", 32)
+    arguments[key] = tuple(decoded)
+    return arguments[key]
 
-        if argValue != "int" and argValue != "string" and argValue != "bool" and argValue != "nil":
-            terminate("Wrong type format!", 32)
 
+# Resolve variable to (frame index, slot), GF names and LF/TF names have separate slots
+def getSlot(slots, frame, name):
+    if frame == "GF":
+        names = slots[0]
     else:
-        terminate("Wrong argument type!", 32)
-
+        names = slots[1]
 
+    slot = names.setdefault(name, len(names))
+    return ({"GF": 0, "LF": 1, "TF": 2}[frame], slot)
 
 
-# Process instruction and its arguments
-def processInstruction(instruction, arguments, instructionList):
-    iListArguments = instructionList.get(instruction)
-    try:
-        iListArgCount = len(iListArguments)
-    except:
-        terminate("Instruction not found!", 32)
-
-    argCount = len(arguments)
+# Convert literal text into its native value
+def convertLiteral(argType, argValue):
+    if argType == "int":
+        try:
+            return int(argValue)
+        except:
+            try:
+                return int(float(argValue))
+            except:
+                terminate("Wrong integer format!", 32)
 
-    if iListArguments is None:
-        terminate("Instruction not found!", 32)
+    elif argType == "bool":
+        return argValue == "true"
 
-    if arguments:
-        checkArgumentAttributes(arguments)
-        arguments = sortArguments(arguments)
-    
-    if iListArgCount != argCount:
-        terminate("Incorrect number of arguments!", 32)
+    elif argType == "string":
+        if "\\" not in argValue:
+            return argValue
+        return getPatterns()["escape"].sub(lambda escape: chr(int(escape.group(1))), argValue)
 
-    for index, listArgType in enumerate(iListArguments):
-        listDataTypes = iListArguments[listArgType]     
-        argType = arguments[index].items()[0][1]
-        argValue = arguments[index].text
+    elif argType == "nil":
+        return nil
 
-        processArguments(listArgType, listDataTypes, argType, argValue)
+    return argValue
 
 
 # Get label positions
-def getLabels(instructions):
+def getLabels(program, opcodeIds):
     labels = {}
+    labelId = opcodeIds["label"]
 
-    for index, inst in enumerate(instructions):
-        opcode = inst.items()[1][1].lower()
-        arguments = list(inst)
-        
-        if opcode == "label":
-            if arguments[0].text in labels:
+    for index, (opcodeId, arguments, order) in enumerate(program):
+        if opcodeId == labelId:
+            if arguments[0][1] in labels:
                 terminate("Label already exists!", 52)
             else:
-                labels[arguments[0].text] = { "index": index }
+                labels[arguments[0][1]] = { "index": index }
             
     return labels
 
 
-# Return a list of symbol values
-def getSymbValues(arguments, argNum, GF, TF, LF):
-    if arguments[argNum].text is None:
-        symbInit = True
-        symbType = arguments[argNum].items()[0][1]
-        symbValue = ""
-    elif arguments[argNum].text.find("@") != -1:
-        frame = arguments[argNum].text[:2]
-        var = arguments[argNum].text[3:]
-
-        if frame == "GF" or frame == "LF" or frame == "TF":
-            if eval(frame).init:
-                try:
-                    symb = eval(frame).variables.get(var).copy()
-                except:
-                    terminate("Variable not found in the frame!", 54)
-                
-                symbInit = symb.get("init")
-                symbType = symb.get("type")
-                symbValue = symb.get("value")
-            else:
-                terminate("Frame is not initialized!", 55)
-        else:
-            symbInit = True
-            symbType = arguments[argNum].items()[0][1]
-            symbValue = arguments[argNum].text
+# Return opcode id => position of the label operand of jumps and calls,
+# superinstructions keep the label of the fused jump after the three operands
+def getLabelOperands(opcodeIds):
+    positions = {}
+    for opcode, operands in getInstructionList().items():
+        if opcode != "label" and "label" in operands:
+            positions[opcodeIds[opcode]] = list(operands).index("label")
+
+    for opcode in getSuperinstructionList():
+        positions[opcodeIds[opcode]] = 3
+
+    return positions
+
+
+# Check that every jump and call refers to a defined label, return label name => index
+def checkLabels(program, opcodeIds):
+    labels = {name: label["index"] for name, label in getLabels(program, opcodeIds).items()}
+    positions = getLabelOperands(opcodeIds)
+
+    for opcodeId, arguments, order in program:
+        if opcodeId in positions and arguments[positions[opcodeId]][1] not in labels:
+            terminate("Label does not exist!", 52)
+
+    return labels
+
+
+# Replace the label operands of jumps and calls by the index of the label,
+# a taken branch then returns the index without any lookup
+# Undefined labels are reported before the program runs
+def resolveLabels(program, opcodeIds):
+    labels = checkLabels(program, opcodeIds)
+    positions = getLabelOperands(opcodeIds)
+
+    resolved = []
+    for opcodeId, arguments, order in program:
+        if opcodeId in positions:
+            position = positions[opcodeId]
+            target = (CONST, labels[arguments[position][1]])
+            arguments = arguments[:position] + (target,) + arguments[position + 1:]
+
+        resolved.append((opcodeId, arguments, order))
+
+    return resolved
+
+
+# Return the value of a variable, None if the variable is not initialized
+def getVarValue(ctx, var):
+    frame = ctx.frames[var[0]]
+
+    if frame.init:
+        value = frame.variables[var[1]]
+        if value is undefined:
+            terminate("Variable not found in the frame!", 54)
+
+        return value
     else:
-        symbInit = True
-        symbType = arguments[argNum].items()[0][1]
-        symbValue = arguments[argNum].text
-
-    return [symbInit, symbType, symbValue]
-
-
-# Assign type, value to var
-def assignToVar(arguments, symbValues, GF, TF, LF):
-    frameVar = processTypeVar(arguments[0].text)
-    frame = frameVar[0]
-    var = frameVar[2]
-
-    symbInit = symbValues[0]
-    symbType = symbValues[1]
-    symbValue = symbValues[2]
-    if eval(frame).init:
-        if var in eval(frame).variables:
-            eval(frame).variables[var]["init"] = symbInit
-            eval(frame).variables[var]["type"] = symbType
-            eval(frame).variables[var]["value"] = symbValue
-        else:
+        terminate("Frame is not initialized!", 55)
+
+
+# Return the value of a symbol
+def getSymbValue(ctx, symb):
+    if symb[0] == CONST:
+        return symb[1]
+
+    value = getVarValue(ctx, symb)
+    if value is None:
+        terminate("Variable is not initialized!", 56)
+
+    if type(value) is StringBuffer:
+        return value.toString()
+
+    return value
+
+
+# Return the value of a symbol, a string being built is returned as its StringBuffer
+# The caller may read the buffer or change it in place but must not store it elsewhere
+def getRawSymbValue(ctx, symb):
+    if symb[0] == CONST:
+        return symb[1]
+
+    value = getVarValue(ctx, symb)
+    if value is None:
+        terminate("Variable is not initialized!", 56)
+
+    return value
+
+
+# Change the number of initialized variables in GF, TF and all frames on the frame stack
+def countInitialized(ctx, change):
+    ctx.initializedVars += change
+    if ctx.initializedVars > ctx.varsPeak:
+        ctx.varsPeak = ctx.initializedVars
+
+
+# Assign value to var
+def assignToVar(ctx, var, value):
+    frame = ctx.frames[var[0]]
+
+    if frame.init:
+        current = frame.variables[var[1]]
+        if current is None:
+            # the first value of the variable, only now the peak can grow
+            frame.initialized += 1
+            countInitialized(ctx, 1)
+        elif current is undefined:
             terminate("Variable not found in the frame!", 54)
+
+        frame.variables[var[1]] = value
     else:
         terminate("Frame not initialized!", 55)
 
 
-# Basic arithmetic operations
-def executeArithmetic(symbType, symbValue, symbValue2, op):
-    if symbType == "int":
-        symbValue = int(symbValue)
-        symbValue2 = int(symbValue2)
-    elif symbType == "bool":
-        symbValue = bool(symbValue)
-        symbValue2 = bool(symbValue2)
+# Return the IPPcode19 type name of a value
+def getType(value):
+    if value is None:
+        return ""
 
-    return op(symbValue, symbValue2)
+    return {bool: "bool", int: "int", str: "string", StringBuffer: "string", Nil: "nil"}[type(value)]
 
 
-# Execute instructions
-def executeInstructions(instructions, GF, TF, LF, stack, inputFile):
-    index = 0
+# Return the value as printed by WRITE
+def formatValue(value):
+    if value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif value is nil:
+        return ""
 
-    labels = getLabels(instructions)
-    dataStack = []
-    returnIndex = None
+    return str(value)
 
-    while index < len(instructions):
-        opcode = instructions[index].items()[1][1]
-        opcode = opcode.lower()
-        arguments = list(instructions[index])
-        arguments = sortArguments(arguments)
 
-        if opcode == "defvar":
-            frameVar = processTypeVar(arguments[0].text)
-            frame = frameVar[0]
-            var = frameVar[2]
+# Class for the interpreter state shared by the instruction handlers
+class Context:
+    def __init__(self, GF, TF, LF, stack, inputReader, output, maxCallDepth):
+        self.GF = GF
+        self.TF = TF
+        self.LF = LF
+        self.frames = [GF, LF, TF]
+        # the top of the frame stack is at the end of the list and is LF,
+        # LF is undefined while the frame stack is empty
+        self.frameStack = stack
+        self.noFrame = Frames()
+        self.inputReader = inputReader
+        self.output = output
+        self.dataStack = []
+        self.callStack = []
+        self.callDepthPeak = 0
+        self.maxCallDepth = maxCallDepth
+        self.executedInstructions = 0
+        self.initializedVars = GF.initialized + LF.initialized + TF.initialized
+        self.varsPeak = self.initializedVars
+        self.dataStackPeak = 0
+        self.frameStackPeak = 0
 
-            eval(frame).append(var, False, "", "")
+    # Replace the local and the temporary frame, handlers find them in frames by index
+    def setFrames(self, LF, TF):
+        self.LF = LF
+        self.TF = TF
+        self.frames[1] = LF
+        self.frames[2] = TF
 
-        elif opcode == "createframe":
-            if TF.init:
-                TF.clearFrame()
 
-            TF.init = True
+# Return values of both operands of a binary operation
+def getBinaryOperands(ctx, arguments):
+    symbValue = getSymbValue(ctx, arguments[1])
+    symbValue2 = getSymbValue(ctx, arguments[2])
 
-        elif opcode == "pushframe":
-            if TF.init:
-                LF.init = True
-                LF.variables = TF.variables.copy()
-                stack.push(copy.copy(LF))
-                TF.init = False
-                TF.clearFrame()
-            else:
-                terminate("Frame not initialized!", 55)
-
-        elif opcode == "popframe":
-            if TF.init:
-                if stack.stack:
-                    TF.variables = eval(stack.top()).variables.copy()
-                    stack.pop()
-                    LF.clearFrame()
-                    LF.init = False
-                else:
-                    terminate("Stack is empty!", 55)
-            else:
-                terminate("Temp. frame does not exist!", 55)
+    return symbValue, symbValue2
 
-        elif opcode == "move":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
 
-            assignToVar(arguments, symbValues, GF, TF, LF)
+# Pop both operands of a binary stack operation, the second operand is on top
+def popBinaryOperands(ctx):
+    dataStack = ctx.dataStack
+    if len(dataStack) < 2:
+        terminate("Data stack is empty!", 56)
 
-        elif opcode == "call":
-            if arguments[0].text in labels:
-                returnIndex = index
-                index = labels[arguments[0].text]["index"] - 1
-            else:
-                terminate("Label does not exist!", 52)
-            
-        elif opcode == "return":
-            if returnIndex is None:
-                terminate("No return value!", 52)
-            else:
-                index = returnIndex
-                returnIndex = None
+    symbValue2 = dataStack.pop()
+    symbValue = dataStack.pop()
 
-        elif opcode == "pushs":
-            symbValues = getSymbValues(arguments, 0, GF, TF, LF)
-            symbType = symbValues[1]
-            symbValue = symbValues[2]
+    return symbValue, symbValue2
 
-            dataStack.insert(0, {"type": symbType, "value": symbValue})
 
-        elif opcode == "pops":
-            if dataStack:
-                stackTop = dataStack[0].copy()
-                del dataStack[0]
+# Pop the operand of a unary stack operation
+def popOperand(ctx):
+    if not ctx.dataStack:
+        terminate("Data stack is empty!", 56)
 
-                symbValues = [True, stackTop["type"], stackTop["value"]]
-                assignToVar(arguments, symbValues, GF, TF, LF)
-            else:
-                terminate("Data stack is empty!", 56)
+    return ctx.dataStack.pop()
 
-        elif opcode == "add":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+# Basic arithmetic operations, both operands have to be integers
+def calculateArithmetic(symbValue, symbValue2, op):
+    if type(symbValue) is not int or type(symbValue2) is not int:
+        terminate("Wrong operand type!", 53)
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+    return op(symbValue, symbValue2)
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.add)
+# Integer division, both operands have to be integers
+def calculateDivision(symbValue, symbValue2):
+    if type(symbValue) is not int or type(symbValue2) is not int:
+        terminate("Wrong operand type!", 53)
 
-            symbValues = [True, "int", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+    if symbValue2 == 0:
+        terminate("Division by zero!", 57)
 
-        elif opcode == "sub":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    return symbValue // symbValue2
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+# Relational operations, operands have to be of the same type, nil is not allowed
+def calculateRelational(symbValue, symbValue2, op):
+    if type(symbValue) is not type(symbValue2) or symbValue is nil:
+        terminate("Wrong operand type!", 53)
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
+    return op(symbValue, symbValue2)
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.sub)
 
-            symbValues = [True, "int", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+# Logical operations, both operands have to be bools
+def calculateLogical(symbValue, symbValue2, op):
+    if type(symbValue) is not bool or type(symbValue2) is not bool:
+        terminate("Wrong operand type!", 53)
 
-        elif opcode == "mul":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    return op(symbValue, symbValue2)
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+# Logical negation, the operand has to be a bool
+def calculateNot(symbValue):
+    if type(symbValue) is not bool:
+        terminate("Wrong operand type!", 53)
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
+    return not symbValue
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.mul)
 
-            symbValues = [True, "int", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+# Equality used by EQ, JUMPIFEQ and JUMPIFNEQ, nil can be compared with any type
+def checkEquality(symbValue, symbValue2):
+    if symbValue is nil or symbValue2 is nil:
+        return symbValue is symbValue2
 
-        elif opcode == "idiv":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    if type(symbValue) is not type(symbValue2):
+        terminate("Wrong operand type!", 53)
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+    return symbValue == symbValue2
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
+# Convert ordinal value to a character
+def calculateInt2char(symbValue):
+    if type(symbValue) is not int:
+        terminate("Wrong operand type!", 53)
 
-            if symbValue2 == "0":
-                terminate("Division by zero!", 57)
+    try:
+        return chr(symbValue)
+    except:
+        terminate("Value is out of range!", 58)
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.floordiv)
 
-            symbValues = [True, "int", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+# Character at the given position
+def calculateGetchar(symbValue, symbValue2):
+    if (type(symbValue) is not str and type(symbValue) is not StringBuffer) or type(symbValue2) is not int:
+        terminate("Wrong operand type!", 53)
 
-        elif opcode == "lt":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    if symbValue2 < 0 or symbValue2 >= len(symbValue):
+        terminate("Value out of range!", 58)
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+    return symbValue[symbValue2]
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
 
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+# Ordinal value of the character at the given position
+def calculateStri2int(symbValue, symbValue2):
+    if (type(symbValue) is not str and type(symbValue) is not StringBuffer) or type(symbValue2) is not int:
+        terminate("Wrong operand type!", 53)
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
+    if symbValue2 < 0 or symbValue2 >= len(symbValue):
+        terminate("Value out of range!", 58)
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.lt)
+    return ord(symbValue[symbValue2])
 
-            symbValues = [True, "bool", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
 
-        elif opcode == "gt":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+############################################ HANDLERS ##############################################
+# Every handler gets the context, the decoded operands and the current index,
+# returns the index of the next instruction
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+def executeMove(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[1])
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+    assignToVar(ctx, arguments[0], symbValue)
+    return index + 1
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.gt)
+# The previous TF is discarded with its variables
+def executeCreateframe(ctx, arguments, index):
+    TF = Frames()
+    TF.init = True
 
-            symbValues = [True, "bool", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+    countInitialized(ctx, -ctx.TF.initialized)
+    ctx.setFrames(ctx.LF, TF)
+    return index + 1
 
-        elif opcode == "eq":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+# TF moves to the top of the frame stack and becomes LF, TF is undefined
+def executePushframe(ctx, arguments, index):
+    if not ctx.TF.init:
+        terminate("Frame not initialized!", 55)
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+    stack = ctx.frameStack
+    stack.append(ctx.TF)
+    ctx.setFrames(ctx.TF, ctx.noFrame)
 
-            if symbType == "nil" and symbType2 == "nil":
-                symbValues = [True, "bool", True]
-            else:
-                result = executeArithmetic(symbType, symbValue, symbValue2, operator.eq)
-                symbValues = [True, "bool", result]
+    if len(stack) > ctx.frameStackPeak:
+        ctx.frameStackPeak = len(stack)
 
-            assignToVar(arguments, symbValues, GF, TF, LF)
+    return index + 1
 
-        elif opcode == "and":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+# LF moves from the top of the frame stack to TF, the frame below becomes LF,
+# the previous TF is discarded with its variables
+def executePopframe(ctx, arguments, index):
+    stack = ctx.frameStack
+    if not stack:
+        terminate("Frame stack is empty!", 55)
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+    countInitialized(ctx, -ctx.TF.initialized)
+    TF = stack.pop()
+    ctx.setFrames(stack[-1] if stack else ctx.noFrame, TF)
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
+    return index + 1
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.and_)
 
-            symbValues = [True, "bool", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+# Defining the variable again drops its value
+def executeDefvar(ctx, arguments, index):
+    var = arguments[0]
+    frame = ctx.frames[var[0]]
 
-        elif opcode == "or":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    initialized = frame.initialized
+    frame.append(var[1])
+    countInitialized(ctx, frame.initialized - initialized)
+    return index + 1
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
-                
-            if symbType != symbType2:
-                terminate("Not matching operand types!", 53)
+def executeCall(ctx, arguments, index):
+    target = arguments[0][1]
 
-            if symbType == "nil" or symbType2 == "nil":
-                terminate("Wrong operand!", 53)
+    callStack = ctx.callStack
+    callStack.append(index + 1)
 
-            result = executeArithmetic(symbType, symbValue, symbValue2, operator.or_)
+    # the depth limit is checked only when the high-water mark grows
+    if len(callStack) > ctx.callDepthPeak:
+        ctx.callDepthPeak = len(callStack)
+        if ctx.callDepthPeak > ctx.maxCallDepth:
+            terminate("Call stack depth limit exceeded!", 99)
 
-            symbValues = [True, "bool", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+    return target
 
-        elif opcode == "not":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            if symbValue == "":
-                terminate("Variable is empty!", 56)
+def executeReturn(ctx, arguments, index):
+    if not ctx.callStack:
+        terminate("Call stack is empty!", 56)
 
-            if symbType == "nil":
-                terminate("Wrong operand!", 53)
+    return ctx.callStack.pop()
 
-            if symbValue == "true":
-                result = "false"
-            elif symbValue == "false":
-                result = "true"
 
-            symbValues = [True, "bool", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+def executePushs(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[0])
 
-        elif opcode == "int2char":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    dataStack = ctx.dataStack
+    dataStack.append(symbValue)
+    if len(dataStack) > ctx.dataStackPeak:
+        ctx.dataStackPeak = len(dataStack)
 
-            if symbValue == "":
-                terminate("Variable is empty!", 56)
+    return index + 1
 
-            if symbType == "nil":
-                terminate("Wrong operand!", 53)
 
-            try:
-                result = chr(symbValue)
-            except:
-                terminate("Value is out of range!", 58)
+def executePops(ctx, arguments, index):
+    if ctx.dataStack:
+        assignToVar(ctx, arguments[0], ctx.dataStack.pop())
+    else:
+        terminate("Data stack is empty!", 56)
 
-            symbValues = [True, "string", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
-            
-        elif opcode == "stri2int":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
-            
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+    return index + 1
 
-            if symbValue == "" or symbValue2 == "":
-                terminate("Variable is empty!", 56)
 
-            if symbType == "nil" or symbType2 == "":
-                terminate("Wrong operand!", 53)
+def executeAdd(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-            try:
-                result = ord(symbValue[int(symbValue2)])
-            except:
-                terminate("Value out of range!", 58)
+    assignToVar(ctx, arguments[0], calculateArithmetic(symbValue, symbValue2, operator.add))
+    return index + 1
 
-            symbValues = [True, "int", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
 
-        elif opcode == "read":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
+def executeSub(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-            if inputFile:
-                with open(inputFile.name) as f:
-                    result = f.readline()
-            else:
-                result = input()
-
-            if symbValue == "int":
-                try:
-                    result = int(result)
-                    symbValues = [True, "int", result]
-                    assignToVar(arguments, symbValues, GF, TF, LF)
-                except:
-                    symbValues = [True, "int", 0]
-                    assignToVar(arguments, symbValues, GF, TF, LF)
-
-            elif symbValue == "string":
-                try:
-                    result = str(result)
-                    symbValues = [True, "string", result]
-                    assignToVar(arguments, symbValues, GF, TF, LF)
-                except:
-                    symbValues = [True, "string", ""]
-                    assignToVar(arguments, symbValues, GF, TF, LF)
-                
-            elif symbValue == "bool":
-                try:
-                    result = result.lower()
-                    if result == "true":
-                        symbValues = [True, "bool", result]
-                    else:
-                        symbValues = [True, "bool", "false"]
-                    
-                    assignToVar(arguments, symbValues, GF, TF, LF)
-                except:
-                    symbValues = [True, "bool", "false"]
-                    assignToVar(arguments, symbValues, GF, TF, LF)
-        
-        elif opcode == "write":
-            symbValues = getSymbValues(arguments, 0, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
-
-            if symbType == "bool":
-                if symbValue == "true":
-                    print(True, end='')
-                elif symbValue == "false":
-                    print(False, end='')
-            else:
-                print(symbValue, end='')
+    assignToVar(ctx, arguments[0], calculateArithmetic(symbValue, symbValue2, operator.sub))
+    return index + 1
 
-        elif opcode == "concat":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+def executeMul(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-            if symbType != "string" or symbType2 != "string":
-                terminate("Wrong operand type!", 53)
+    assignToVar(ctx, arguments[0], calculateArithmetic(symbValue, symbValue2, operator.mul))
+    return index + 1
 
-            result = symbValue + symbValue2
 
-            symbValues = [True, "string", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+def executeIdiv(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-        elif opcode == "strlen":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    assignToVar(ctx, arguments[0], calculateDivision(symbValue, symbValue2))
+    return index + 1
 
-            if symbType != "string":
-                terminate("Wrong operand type!", 53)
 
-            result = len(symbValue)
-            symbValues = [True, "int", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+def executeLt(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-        elif opcode == "getchar":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    assignToVar(ctx, arguments[0], calculateRelational(symbValue, symbValue2, operator.lt))
+    return index + 1
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
 
-            if symbType != "string" or symbType2 != "int":
-                terminate("Wrong operand type!", 53)
+def executeGt(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-            try:
-                result = symbValue[int(symbValue2)]
-            except:
-                terminate("Value out of range!", 58)
-            
-            symbValues = [True, "string", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
-
-        elif opcode == "setchar":
-            frameVar = processTypeVar(arguments[0].text)
-            frame = frameVar[0]
-            var = frameVar[2]
-
-            if eval(frame).init:
-                try:
-                    symb = eval(frame).variables.get(var).copy()
-                except:
-                    terminate("Variable not found in the frame!", 54)
-                
-                varType = symb.get("type")
-                varValue = symb.get("value")
-            else:
-                terminate("Frame is not initialized!", 55)
+    assignToVar(ctx, arguments[0], calculateRelational(symbValue, symbValue2, operator.gt))
+    return index + 1
 
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+def executeEq(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-            if varType != "string" or symbType != "int" or symbType2 != "string":
-                terminate("Wrong operand type!", 53)
+    assignToVar(ctx, arguments[0], checkEquality(symbValue, symbValue2))
+    return index + 1
 
-            if symbValue2 == "":
-                terminate("Empty string!", 58)
 
-            try:
-                varValue = list(varValue)
-                varValue[int(symbValue)] = symbValue2[0]
-                varValue = ''.join(varValue)
-            except:
-                terminate("Value out of range!", 58)
+def executeAnd(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-            symbValues = [True, "string", varValue]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+    assignToVar(ctx, arguments[0], calculateLogical(symbValue, symbValue2, operator.and_))
+    return index + 1
 
-        elif opcode == "type":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbType = symbValues[1]
 
-            result = symbType
-            symbValues = [True, "string", result]
-            assignToVar(arguments, symbValues, GF, TF, LF)
+def executeOr(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
 
-        elif opcode == "jump":
-            if arguments[0].text in labels:
-                index = labels[arguments[0].text]["index"] - 1
-            else:
-                terminate("Label does not exist!", 52)
+    assignToVar(ctx, arguments[0], calculateLogical(symbValue, symbValue2, operator.or_))
+    return index + 1
 
-        elif opcode == "jumpifeq":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+def executeNot(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[1])
 
-            if symbType != symbType2:
-                terminate("Types not match!", 53)
+    assignToVar(ctx, arguments[0], calculateNot(symbValue))
+    return index + 1
 
-            if symbValue == symbValue2:
-                if arguments[0].text in labels:
-                    index = labels[arguments[0].text]["index"] - 1
-                else:
-                    terminate("Label does not exist!", 52)
 
-        elif opcode == "jumpifneq":
-            symbValues = getSymbValues(arguments, 1, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+def executeInt2char(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[1])
 
-            symbValues = getSymbValues(arguments, 2, GF, TF, LF)
-            symbValue2 = symbValues[2]
-            symbType2 = symbValues[1]
+    assignToVar(ctx, arguments[0], calculateInt2char(symbValue))
+    return index + 1
 
-            if symbType != symbType2:
-                terminate("Types not match!", 53)
 
-            if symbValue != symbValue2:
-                if arguments[0].text in labels:
-                    index = labels[arguments[0].text]["index"] - 1
-                else:
-                    terminate("Label does not exist!", 52)
+def executeStri2int(ctx, arguments, index):
+    symbValue = getRawSymbValue(ctx, arguments[1])
+    symbValue2 = getSymbValue(ctx, arguments[2])
 
-        elif opcode == "exit":
-            symbValues = getSymbValues(arguments, 0, GF, TF, LF)
-            symbValue = symbValues[2]
-            symbType = symbValues[1]
+    assignToVar(ctx, arguments[0], calculateStri2int(symbValue, symbValue2))
+    return index + 1
 
-            if symbType != "int":
-                terminate("Wrong operand type!", 53)
 
-            symbValue = int(symbValue)
-            if symbValue < 0 or symbValue > 49:
-                terminate("Value out of range!", 57)
+def executeRead(ctx, arguments, index):
+    symbType = arguments[1][1]
 
-            sys.exit(symbValue)
-        
-        elif opcode == "dprint":
-            symbValues = getSymbValues(arguments, 0, GF, TF, LF)
-            symbValue = symbValues[2]
+    # missing input gives the default value of the type
+    result = ctx.inputReader.readLine()
+    if result is None:
+        result = ""
 
-            print(symbValue, file=sys.stderr)
+    if symbType == "int":
+        try:
+            result = int(result)
+        except:
+            result = 0
 
-        elif opcode == "break":
-            print("Currently processing instruction number: {}".format(index+1), file=sys.stderr)
+    elif symbType == "bool":
+        result = result.lower() == "true"
 
-        index = index + 1
+    assignToVar(ctx, arguments[0], result)
+    return index + 1
 
-        
-# Prepare instructions for processing
-def prepareInstructions(xmlTree, GF, TF, LF, stack, inputFile):
-    instructions = xmlTree.findall("instruction")
-    instructions = sortInstructions(instructions)
 
-    instructionList = getInstructionList()
+def executeWrite(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[0])
 
-    index = 0
-    while index < len(instructions):
-        checkInstructionAttributes(instructions[index].items())
+    ctx.output.write(formatValue(symbValue))
+    return index + 1
 
-        opcode = instructions[index].items()[1][1]
-        opcode = opcode.lower()
-        arguments = list(instructions[index])
-        processInstruction(opcode, arguments, instructionList)
 
-        index = index + 1
+def executeConcat(ctx, arguments, index):
+    symbValue = getRawSymbValue(ctx, arguments[1])
+    symbValue2 = getSymbValue(ctx, arguments[2])
 
-    executeInstructions(instructions, GF, TF, LF, stack, inputFile)
+    if (type(symbValue) is not str and type(symbValue) is not StringBuffer) or type(symbValue2) is not str:
+        terminate("Wrong operand type!", 53)
 
+    # appending to the variable itself extends its buffer in place
+    if arguments[1] == arguments[0]:
+        if type(symbValue) is str:
+            assignToVar(ctx, arguments[0], StringBuffer(symbValue))
+            symbValue = getRawSymbValue(ctx, arguments[0])
 
+        symbValue.append(symbValue2)
+        return index + 1
 
-############################################### MAIN ###############################################
-def main():
+    if type(symbValue) is StringBuffer:
+        symbValue = symbValue.toString()
 
-    if len(sys.argv) <= 1:
-        terminate("Wrong number of arguments!", 10)
+    assignToVar(ctx, arguments[0], symbValue + symbValue2)
+    return index + 1
 
-    if sys.argv[1] == "--help" or sys.argv[1] == "-h":
-        print("Use arguments --source and --input!")
-        sys.exit(0)
 
-    # parse program arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--source', help = "XML file", type = argparse.FileType('r'))
-    parser.add_argument('--input', help = "XML file", type = argparse.FileType('r'))
+def executeStrlen(ctx, arguments, index):
+    symbValue = getRawSymbValue(ctx, arguments[1])
 
-    try:
-        args = parser.parse_args()
-    except:
-        sys.exit(10)
-        
-    sourceFile = args.source
-    inputFile = args.input
+    if type(symbValue) is not str and type(symbValue) is not StringBuffer:
+        terminate("Wrong operand type!", 53)
 
-    # choose between stdin and file
-    if sourceFile:
-        parseSource = sourceFile
-    else:
-        parseSource = sys.stdin
-    
-    if inputFile is None:
-        inputFile = sys.stdin
+    assignToVar(ctx, arguments[0], len(symbValue))
+    return index + 1
 
-    # parse XML
-    try:
-        xmlTree = ET.parse(parseSource)
-    except:
-        terminate("Wrong XML format!", 31)
 
-    # check if root exists
-    xmlRoot = xmlTree.getroot()
-    if xmlRoot:
-        checkRoot(xmlRoot)
+def executeGetchar(ctx, arguments, index):
+    symbValue = getRawSymbValue(ctx, arguments[1])
+    symbValue2 = getSymbValue(ctx, arguments[2])
+
+    assignToVar(ctx, arguments[0], calculateGetchar(symbValue, symbValue2))
+    return index + 1
+
+
+def executeSetchar(ctx, arguments, index):
+    varValue = getRawSymbValue(ctx, arguments[0])
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    if type(varValue) is not str and type(varValue) is not StringBuffer:
+        terminate("Wrong operand type!", 53)
+
+    if type(symbValue) is not int or type(symbValue2) is not str:
+        terminate("Wrong operand type!", 53)
+
+    if symbValue < 0 or symbValue >= len(varValue) or symbValue2 == "":
+        terminate("Value out of range!", 58)
+
+    # the character is changed in place in the buffer of the variable
+    if type(varValue) is str:
+        varValue = StringBuffer(varValue)
+        assignToVar(ctx, arguments[0], varValue)
+
+    varValue.setChar(symbValue, symbValue2[0])
+    return index + 1
+
+
+def executeType(ctx, arguments, index):
+    symb = arguments[1]
+    if symb[0] == CONST:
+        symbValue = symb[1]
     else:
-        terminate("XML Root not found", 31)
+        symbValue = getVarValue(ctx, symb)
 
-    # create frames and stack
-    stack = Stack()
-    GF = Frames()
-    LF = Frames()
-    TF = Frames()
+    assignToVar(ctx, arguments[0], getType(symbValue))
+    return index + 1
 
-    GF.init = True 
-    stack.push("GF")
-  
 
-    # process instructions from XML
-    prepareInstructions(xmlTree, GF, TF, LF, stack, inputFile)
+def executeLabel(ctx, arguments, index):
+    return index + 1
+
+
+def executeJump(ctx, arguments, index):
+    return arguments[0][1]
+
+
+def executeJumpifeq(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    if checkEquality(symbValue, symbValue2):
+        return arguments[0][1]
+
+    return index + 1
+
+
+def executeJumpifneq(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    if not checkEquality(symbValue, symbValue2):
+        return arguments[0][1]
+
+    return index + 1
+
+
+def executeExit(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[0])
+
+    if type(symbValue) is not int:
+        terminate("Wrong operand type!", 53)
+
+    if symbValue < 0 or symbValue > 49:
+        terminate("Value out of range!", 57)
+
+    ctx.output.flush()
+    sys.exit(symbValue)
+
+
+def executeDprint(ctx, arguments, index):
+    symbValue = getSymbValue(ctx, arguments[0])
+
+    ctx.output.flush()
+    print(formatValue(symbValue), file=sys.stderr)
+    return index + 1
+
+
+# BREAK carries its position in the loaded program, optimizations do not change it
+def executeBreak(ctx, arguments, index):
+    ctx.output.flush()
+    print("Currently processing instruction number: {}".format(arguments[0][1]), file=sys.stderr)
+    return index + 1
+
+
+# STACK extension, operands are taken from the data stack and the result is pushed back
+
+def executeClears(ctx, arguments, index):
+    ctx.dataStack.clear()
+    return index + 1
+
+
+def executeAdds(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateArithmetic(symbValue, symbValue2, operator.add))
+    return index + 1
+
+
+def executeSubs(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateArithmetic(symbValue, symbValue2, operator.sub))
+    return index + 1
+
+
+def executeMuls(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateArithmetic(symbValue, symbValue2, operator.mul))
+    return index + 1
+
+
+def executeIdivs(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateDivision(symbValue, symbValue2))
+    return index + 1
+
+
+def executeLts(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateRelational(symbValue, symbValue2, operator.lt))
+    return index + 1
+
+
+def executeGts(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateRelational(symbValue, symbValue2, operator.gt))
+    return index + 1
+
+
+def executeEqs(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(checkEquality(symbValue, symbValue2))
+    return index + 1
+
+
+def executeAnds(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateLogical(symbValue, symbValue2, operator.and_))
+    return index + 1
+
+
+def executeOrs(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateLogical(symbValue, symbValue2, operator.or_))
+    return index + 1
+
+
+def executeNots(ctx, arguments, index):
+    symbValue = popOperand(ctx)
+
+    ctx.dataStack.append(calculateNot(symbValue))
+    return index + 1
+
+
+def executeInt2chars(ctx, arguments, index):
+    symbValue = popOperand(ctx)
+
+    ctx.dataStack.append(calculateInt2char(symbValue))
+    return index + 1
+
+
+def executeStri2ints(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    ctx.dataStack.append(calculateStri2int(symbValue, symbValue2))
+    return index + 1
+
+
+def executeJumpifeqs(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    if checkEquality(symbValue, symbValue2):
+        return arguments[0][1]
+
+    return index + 1
+
+
+def executeJumpifneqs(ctx, arguments, index):
+    symbValue, symbValue2 = popBinaryOperands(ctx)
+
+    if not checkEquality(symbValue, symbValue2):
+        return arguments[0][1]
+
+    return index + 1
+
+
+# Superinstructions fused by fuseInstructions, each does the work of both instructions
+
+# ADD/SUB var symb1 symb2 + JUMP label
+def executeAddjump(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    assignToVar(ctx, arguments[0], calculateArithmetic(symbValue, symbValue2, operator.add))
+    return arguments[3][1]
+
+
+def executeSubjump(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    assignToVar(ctx, arguments[0], calculateArithmetic(symbValue, symbValue2, operator.sub))
+    return arguments[3][1]
+
+
+# LT/GT/EQ var symb1 symb2 + jump to label when the result is the expected bool
+def executeLtjump(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    result = calculateRelational(symbValue, symbValue2, operator.lt)
+    assignToVar(ctx, arguments[0], result)
+    if result is arguments[4][1]:
+        return arguments[3][1]
+
+    return index + 1
+
+
+def executeGtjump(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    result = calculateRelational(symbValue, symbValue2, operator.gt)
+    assignToVar(ctx, arguments[0], result)
+    if result is arguments[4][1]:
+        return arguments[3][1]
+
+    return index + 1
+
+
+def executeEqjump(ctx, arguments, index):
+    symbValue, symbValue2 = getBinaryOperands(ctx, arguments)
+
+    result = checkEquality(symbValue, symbValue2)
+    assignToVar(ctx, arguments[0], result)
+    if result is arguments[4][1]:
+        return arguments[3][1]
+
+    return index + 1
+
+
+# GETCHAR var symb1 symb2 + jump to label when the character (not) equals the constant
+def executeGetcharjump(ctx, arguments, index):
+    symbValue = getRawSymbValue(ctx, arguments[1])
+    symbValue2 = getSymbValue(ctx, arguments[2])
+
+    result = calculateGetchar(symbValue, symbValue2)
+    assignToVar(ctx, arguments[0], result)
+    if (result == arguments[4][1]) is arguments[5][1]:
+        return arguments[3][1]
+
+    return index + 1
+
+
+# Specialized handlers chosen by specializeInstructions for instructions with proven operand
+# types, operands are (values, key) pairs, a symbol is values[key] and needs no checks
+# The result goes to a defined GF variable, its first value is stored by assignToVar
+
+# ADD/SUB/MUL/LT/GT/EQ/AND/OR var symb1 symb2 with the operation
+def executeTypedoperation(ctx, arguments, index):
+    result, symb, symb2, op = arguments
+
+    value = op(symb[0][symb[1]], symb2[0][symb2[1]])
+    if result[0][result[1]] is None:
+        assignToVar(ctx, (0, result[1]), value)
+    else:
+        result[0][result[1]] = value
+    return index + 1
+
+
+def executeTypednot(ctx, arguments, index):
+    result, symb = arguments
+
+    value = not symb[0][symb[1]]
+    if result[0][result[1]] is None:
+        assignToVar(ctx, (0, result[1]), value)
+    else:
+        result[0][result[1]] = value
+    return index + 1
+
+
+# JUMPIFEQ/JUMPIFNEQ label symb1 symb2 with the comparison
+def executeTypedbranch(ctx, arguments, index):
+    target, symb, symb2, op = arguments
+
+    if op(symb[0][symb[1]], symb2[0][symb2[1]]):
+        return target
+
+    return index + 1
+
+
+# ADDJUMP/SUBJUMP with the operation
+def executeTypedoperationjump(ctx, arguments, index):
+    result, symb, symb2, op, target = arguments
+
+    value = op(symb[0][symb[1]], symb2[0][symb2[1]])
+    if result[0][result[1]] is None:
+        assignToVar(ctx, (0, result[1]), value)
+    else:
+        result[0][result[1]] = value
+    return target
+
+
+# LTJUMP/GTJUMP/EQJUMP with the comparison
+def executeTypedcomparejump(ctx, arguments, index):
+    result, symb, symb2, op, target, jumpWhen = arguments
+
+    value = op(symb[0][symb[1]], symb2[0][symb2[1]])
+    if result[0][result[1]] is None:
+        assignToVar(ctx, (0, result[1]), value)
+    else:
+        result[0][result[1]] = value
+    if value is jumpWhen:
+        return target
+
+    return index + 1
+
+
+# Map every opcode from getInstructionList, getSuperinstructionList and getSpecializedList
+# to its handler, the table is indexed by opcode id
+def getHandlerTable():
+    handlers = {
+        "move": executeMove,
+        "createframe": executeCreateframe,
+        "pushframe": executePushframe,
+        "popframe": executePopframe,
+        "defvar": executeDefvar,
+        "call": executeCall,
+        "return": executeReturn,
+        "pushs": executePushs,
+        "pops": executePops,
+        "add": executeAdd,
+        "sub": executeSub,
+        "mul": executeMul,
+        "idiv": executeIdiv,
+        "lt": executeLt,
+        "gt": executeGt,
+        "eq": executeEq,
+        "and": executeAnd,
+        "or": executeOr,
+        "not": executeNot,
+        "int2char": executeInt2char,
+        "stri2int": executeStri2int,
+        "read": executeRead,
+        "write": executeWrite,
+        "concat": executeConcat,
+        "strlen": executeStrlen,
+        "getchar": executeGetchar,
+        "setchar": executeSetchar,
+        "type": executeType,
+        "label": executeLabel,
+        "jump": executeJump,
+        "jumpifeq": executeJumpifeq,
+        "jumpifneq": executeJumpifneq,
+        "exit": executeExit,
+        "dprint": executeDprint,
+        "break": executeBreak,
+        "clears": executeClears,
+        "adds": executeAdds,
+        "subs": executeSubs,
+        "muls": executeMuls,
+        "idivs": executeIdivs,
+        "lts": executeLts,
+        "gts": executeGts,
+        "eqs": executeEqs,
+        "ands": executeAnds,
+        "ors": executeOrs,
+        "nots": executeNots,
+        "int2chars": executeInt2chars,
+        "stri2ints": executeStri2ints,
+        "jumpifeqs": executeJumpifeqs,
+        "jumpifneqs": executeJumpifneqs,
+        "addjump": executeAddjump,
+        "subjump": executeSubjump,
+        "ltjump": executeLtjump,
+        "gtjump": executeGtjump,
+        "eqjump": executeEqjump,
+        "getcharjump": executeGetcharjump,
+        "typedoperation": executeTypedoperation,
+        "typednot": executeTypednot,
+        "typedbranch": executeTypedbranch,
+        "typedoperationjump": executeTypedoperationjump,
+        "typedcomparejump": executeTypedcomparejump
+    }
+
+    return [handlers[opcode] for opcode in getOpcodeIds()]
+
+
+########################################### OPTIMIZER ##############################################
+# Optional pass between loading and execution, output and exit codes do not change
+
+# Compute the result of an operation with constant operands,
+# None if the operation has to stay because it fails at runtime
+def foldOperation(opcode, values):
+    symbValue = values[0]
+    symbValue2 = values[1] if len(values) > 1 else None
+
+    if opcode == "move":
+        return symbValue
+
+    elif opcode == "type":
+        return getType(symbValue)
+
+    elif opcode in ("add", "sub", "mul", "idiv"):
+        if type(symbValue) is not int or type(symbValue2) is not int:
+            return None
+
+        if opcode == "add":
+            return symbValue + symbValue2
+        elif opcode == "sub":
+            return symbValue - symbValue2
+        elif opcode == "mul":
+            return symbValue * symbValue2
+        elif symbValue2 != 0:
+            return symbValue // symbValue2
+
+    elif opcode in ("lt", "gt"):
+        if type(symbValue) is not type(symbValue2) or symbValue is nil:
+            return None
+
+        if opcode == "lt":
+            return symbValue < symbValue2
+        else:
+            return symbValue > symbValue2
+
+    elif opcode == "eq":
+        if symbValue is nil or symbValue2 is nil:
+            return symbValue is symbValue2
+
+        if type(symbValue) is type(symbValue2):
+            return symbValue == symbValue2
+
+    elif opcode in ("and", "or"):
+        if type(symbValue) is bool and type(symbValue2) is bool:
+            if opcode == "and":
+                return symbValue and symbValue2
+            else:
+                return symbValue or symbValue2
+
+    elif opcode == "not":
+        if type(symbValue) is bool:
+            return not symbValue
+
+    elif opcode == "int2char":
+        if type(symbValue) is int and 0 <= symbValue <= 0x10FFFF:
+            return chr(symbValue)
+
+    elif opcode == "concat":
+        if type(symbValue) is str and type(symbValue2) is str:
+            return symbValue + symbValue2
+
+    elif opcode == "strlen":
+        if type(symbValue) is str:
+            return len(symbValue)
+
+    elif opcode in ("stri2int", "getchar"):
+        if type(symbValue) is str and type(symbValue2) is int and 0 <= symbValue2 < len(symbValue):
+            if opcode == "stri2int":
+                return ord(symbValue[symbValue2])
+            else:
+                return symbValue[symbValue2]
+
+    return None
+
+
+# Constant propagation and folding inside basic blocks, values of variables assigned
+# a constant are known until the variable is written again or a block ends
+def foldConstants(program, opcodes):
+    instructionList = getInstructionList()
+    opcodeIds = {name: opcodeId for opcodeId, name in enumerate(opcodes)}
+    foldable = ("move", "type", "add", "sub", "mul", "idiv", "lt", "gt", "eq", "and", "or", "not",
+                "int2char", "concat", "strlen", "stri2int", "getchar")
+
+    optimized = []
+    known = {}
+    for opcodeId, arguments, order in program:
+        opcode = opcodes[opcodeId]
+        argTypes = list(instructionList[opcode])
+
+        # labels join several paths, nothing is known there
+        if opcode == "label":
+            known.clear()
+
+        # replace known variables in the read operands by constants, operands past
+        # the signature like the position of BREAK are kept as they are
+        if known:
+            arguments = tuple((CONST, known[operand]) if argType.startswith("symb") and operand in known else operand
+                              for argType, operand in zip(argTypes, arguments)) + arguments[len(argTypes):]
+
+        symbs = [operand for argType, operand in zip(argTypes, arguments) if argType.startswith("symb")]
+        constant = bool(symbs) and all(operand[0] == CONST for operand in symbs)
+
+        if opcode in ("jumpifeq", "jumpifneq") and constant:
+            equal = foldOperation("eq", [operand[1] for operand in symbs])
+            if equal is not None:
+                if equal == (opcode == "jumpifeq"):
+                    optimized.append((opcodeIds["jump"], arguments[:1], order))
+                continue
+
+        result = None
+        if opcode in foldable and constant:
+            result = foldOperation(opcode, [operand[1] for operand in symbs])
+            if result is not None:
+                opcodeId = opcodeIds["move"]
+                arguments = (arguments[0], (CONST, result))
+
+        optimized.append((opcodeId, arguments, order))
+
+        # update the knowledge after the instruction
+        if argTypes and argTypes[0] == "var":
+            if result is not None:
+                known[arguments[0]] = result
+            else:
+                known.pop(arguments[0], None)
+
+        elif opcode in ("createframe", "pushframe", "popframe"):
+            known = {var: value for var, value in known.items() if var[0] == 0}
+
+        elif opcode == "call":
+            known.clear()
+
+    return optimized
+
+
+# Return label name => index for the given program
+def getLabelIndexes(program, opcodeIds):
+    labels = getLabels(program, opcodeIds)
+    return {name: label["index"] for name, label in labels.items()}
+
+
+# Retarget jumps landing on an unconditional JUMP to its final label,
+# drop JUMPs to the label right after them and turn a conditional jump over
+# an unconditional JUMP into the inverse conditional jump
+def threadJumps(program, opcodeIds):
+    labels = getLabelIndexes(program, opcodeIds)
+    labelId = opcodeIds["label"]
+    jumpId = opcodeIds["jump"]
+    positions = getLabelOperands(opcodeIds)
+    inverse = {opcodeIds["jumpifeq"]: opcodeIds["jumpifneq"], opcodeIds["jumpifneq"]: opcodeIds["jumpifeq"],
+               opcodeIds["jumpifeqs"]: opcodeIds["jumpifneqs"], opcodeIds["jumpifneqs"]: opcodeIds["jumpifeqs"]}
+
+    # first instruction after the label which is not a label
+    def skipLabels(index):
+        while index < len(program) and program[index][0] == labelId:
+            index = index + 1
+        return index
+
+    def finalLabel(label):
+        seen = set()
+        while label in labels and label not in seen:
+            seen.add(label)
+            index = skipLabels(labels[label])
+            if index < len(program) and program[index][0] == jumpId:
+                label = program[index][1][0][1]
+            else:
+                break
+        return label
+
+    # the label is among the labels right after the index
+    def labelFollows(index, label):
+        return label in labels and index < labels[label] and skipLabels(index + 1) > labels[label]
+
+    optimized = []
+    skipNext = False
+    for index, (opcodeId, arguments, order) in enumerate(program):
+        if skipNext:
+            skipNext = False
+            continue
+
+        if opcodeId in positions:
+            position = positions[opcodeId]
+            label = finalLabel(arguments[position][1])
+            arguments = arguments[:position] + ((CONST, label),) + arguments[position + 1:]
+
+            if opcodeId == jumpId and labelFollows(index, label):
+                continue
+
+            if opcodeId in inverse and index + 1 < len(program) and program[index + 1][0] == jumpId \
+                    and labelFollows(index + 1, label):
+                opcodeId = inverse[opcodeId]
+                arguments = ((CONST, finalLabel(program[index + 1][1][0][1])),) + arguments[1:]
+                skipNext = True
+
+        optimized.append((opcodeId, arguments, order))
+
+    return optimized
+
+
+# Remove instructions which can not be reached from the start of the program
+def removeDeadCode(program, opcodeIds):
+    labels = getLabelIndexes(program, opcodeIds)
+    positions = getLabelOperands(opcodeIds)
+    noFallthrough = [opcodeIds[opcode] for opcode in ("jump", "exit", "return")]
+
+    reachable = [False] * len(program)
+    work = [0]
+    while work:
+        index = work.pop()
+        if index >= len(program) or reachable[index]:
+            continue
+
+        reachable[index] = True
+        opcodeId, arguments, order = program[index]
+
+        if opcodeId in positions and arguments[positions[opcodeId]][1] in labels:
+            work.append(labels[arguments[positions[opcodeId]][1]])
+
+        if opcodeId not in noFallthrough:
+            work.append(index + 1)
+
+    return [instruction for index, instruction in enumerate(program) if reachable[index]]
+
+
+# Remove labels no jump or call refers to
+def removeUnusedLabels(program, opcodeIds):
+    labelId = opcodeIds["label"]
+    positions = getLabelOperands(opcodeIds)
+
+    used = set(arguments[positions[opcodeId]][1] for opcodeId, arguments, order in program if opcodeId in positions)
+    return [instruction for instruction in program
+            if instruction[0] != labelId or instruction[1][0][1] in used]
+
+
+# Optimize the program, passes are repeated while the program shrinks, jumps and calls
+# are found by getLabelOperands so the passes know the same opcodes as resolveLabels
+def optimizeProgram(program):
+    opcodes = list(getInstructionList())
+    opcodeIds = getOpcodeIds()
+
+    # duplicate and undefined labels are reported before anything is changed
+    checkLabels(program, opcodeIds)
+
+    length = None
+    while length != len(program):
+        length = len(program)
+        program = foldConstants(program, opcodes)
+        program = threadJumps(program, opcodeIds)
+        program = removeDeadCode(program, opcodeIds)
+        program = removeUnusedLabels(program, opcodeIds)
+
+    return program
+
+
+# Replace a pair of instructions by a superinstruction, None if the pair can not be fused
+# The second instruction is reachable only from the first one as jumps lead to labels,
+# the superinstruction keeps the order number of the first one
+def fusePair(first, second, opcodeIds):
+    opcodeId, arguments, order = first
+    opcodeId2, arguments2, order2 = second
+
+    # ADD/SUB followed by JUMP
+    if opcodeId2 == opcodeIds["jump"]:
+        if opcodeId == opcodeIds["add"]:
+            return (opcodeIds["addjump"], arguments + arguments2, order)
+        elif opcodeId == opcodeIds["sub"]:
+            return (opcodeIds["subjump"], arguments + arguments2, order)
+        return None
+
+    if opcodeId2 != opcodeIds["jumpifeq"] and opcodeId2 != opcodeIds["jumpifneq"]:
+        return None
+
+    comparisons = {opcodeIds["lt"]: "ltjump", opcodeIds["gt"]: "gtjump", opcodeIds["eq"]: "eqjump"}
+    if opcodeId not in comparisons and opcodeId != opcodeIds["getchar"]:
+        return None
+
+    # the conditional jump compares the result with a constant
+    if arguments2[1] == arguments[0]:
+        other = arguments2[2]
+    elif arguments2[2] == arguments[0]:
+        other = arguments2[1]
+    else:
+        return None
+
+    if other[0] != CONST:
+        return None
+
+    jumpIfEqual = opcodeId2 == opcodeIds["jumpifeq"]
+
+    # LT/GT/EQ into a temporary followed by a jump on its bool value
+    if opcodeId in comparisons and type(other[1]) is bool:
+        jumpWhen = other[1] if jumpIfEqual else not other[1]
+        return (opcodeIds[comparisons[opcodeId]], arguments + (arguments2[0], (CONST, jumpWhen)), order)
+
+    # GETCHAR followed by a jump on the character
+    if opcodeId == opcodeIds["getchar"] and type(other[1]) is str:
+        return (opcodeIds["getcharjump"], arguments + (arguments2[0], other, (CONST, jumpIfEqual)), order)
+
+    return None
+
+
+# Fuse hot instruction pairs into superinstructions
+def fuseInstructions(program):
+    opcodeIds = getOpcodeIds()
+
+    fused = []
+    index = 0
+    while index < len(program):
+        if index + 1 < len(program):
+            record = fusePair(program[index], program[index + 1], opcodeIds)
+            if record is not None:
+                fused.append(record)
+                index = index + 2
+                continue
+
+        fused.append(program[index])
+        index = index + 1
+
+    return fused
+
+
+# Types a GF variable may hold at a program point as a bit mask, NONE is a defined
+# variable without a value, UNDEFINED a variable DEFVAR has not defined yet
+TYPE_INT = 1
+TYPE_BOOL = 2
+TYPE_STRING = 4
+TYPE_NIL = 8
+TYPE_NONE = 16
+TYPE_UNDEFINED = 32
+TYPE_VALUE = TYPE_INT | TYPE_BOOL | TYPE_STRING | TYPE_NIL
+
+
+# Return opcode name => type of the value the instruction stores to its var operand
+def getResultTypes():
+    return {
+        "defvar": TYPE_NONE, "pops": TYPE_VALUE, "read": TYPE_VALUE,
+        "add": TYPE_INT, "sub": TYPE_INT, "mul": TYPE_INT, "idiv": TYPE_INT,
+        "stri2int": TYPE_INT, "strlen": TYPE_INT, "addjump": TYPE_INT, "subjump": TYPE_INT,
+        "lt": TYPE_BOOL, "gt": TYPE_BOOL, "eq": TYPE_BOOL, "and": TYPE_BOOL, "or": TYPE_BOOL,
+        "not": TYPE_BOOL, "ltjump": TYPE_BOOL, "gtjump": TYPE_BOOL, "eqjump": TYPE_BOOL,
+        "int2char": TYPE_STRING, "concat": TYPE_STRING, "getchar": TYPE_STRING,
+        "setchar": TYPE_STRING, "type": TYPE_STRING, "getcharjump": TYPE_STRING
+    }
+
+
+# Return the type mask of a symbol, only GF variables are tracked, LF and TF variables may hold anything
+def getSymbType(state, symb):
+    if symb[0] == CONST:
+        return {bool: TYPE_BOOL, int: TYPE_INT, str: TYPE_STRING, Nil: TYPE_NIL}[type(symb[1])]
+    elif symb[0] == 0:
+        return state.get(symb[1], TYPE_UNDEFINED)
+
+    return TYPE_VALUE | TYPE_NONE | TYPE_UNDEFINED
+
+
+# Apply the instruction to the state, GF slot => type mask, missing slots are undefined
+# An instruction that fails does not continue, so MOVE stores only the value types of its symbol
+def inferInstruction(state, opcode, arguments, resultTypes):
+    if opcode == "move":
+        resultType = getSymbType(state, arguments[1]) & TYPE_VALUE
+    elif opcode in resultTypes:
+        resultType = resultTypes[opcode]
+    else:
+        return
+
+    if arguments[0][0] == 0:
+        state[arguments[0][1]] = resultType
+
+
+# Split the program into basic blocks, labels have to be resolved to indexes, return
+# index => successors of the instructions that do not just continue with the next one
+# and the set of block starts, the end of the program is a block start too
+# RETURN may continue after any CALL, the analysis does not pair them
+def getBasicBlocks(program, names):
+    returnSites = [index + 1 for index, (opcodeId, arguments, order) in enumerate(program)
+                   if names[opcodeId] == "call"]
+
+    branches = {}
+    leaders = {0, len(program)}
+    for index, (opcodeId, arguments, order) in enumerate(program):
+        opcode = names[opcodeId]
+        if opcode == "jump" or opcode == "call":
+            branches[index] = [arguments[0][1]]
+        elif opcode in ("jumpifeq", "jumpifneq", "jumpifeqs", "jumpifneqs"):
+            branches[index] = [arguments[0][1], index + 1]
+        elif opcode == "addjump" or opcode == "subjump":
+            branches[index] = [arguments[3][1]]
+        elif opcode in ("ltjump", "gtjump", "eqjump", "getcharjump"):
+            branches[index] = [arguments[3][1], index + 1]
+        elif opcode == "typedbranch":
+            branches[index] = [arguments[0], index + 1]
+        elif opcode == "typedoperationjump":
+            branches[index] = [arguments[4]]
+        elif opcode == "typedcomparejump":
+            branches[index] = [arguments[4], index + 1]
+        elif opcode == "return":
+            branches[index] = returnSites
+        elif opcode == "exit":
+            branches[index] = []
+        else:
+            continue
+
+        leaders.update(branches[index])
+        leaders.add(index + 1)
+
+    return branches, leaders
+
+
+# Join the state reaching a block into its entry state, return the new entry state,
+# None if it has not changed
+def mergeStates(entry, state):
+    if entry is None:
+        return dict(state)
+
+    merged = None
+    for slot in set(entry) | set(state):
+        types = entry.get(slot, TYPE_UNDEFINED) | state.get(slot, TYPE_UNDEFINED)
+        if types != entry.get(slot, TYPE_UNDEFINED):
+            if merged is None:
+                merged = dict(entry)
+            merged[slot] = types
+
+    return merged
+
+
+# Infer the types of GF variables at the start of every reachable basic block,
+# return block start => state, the states only grow so the iteration ends
+def inferTypes(program, names, branches, leaders):
+    resultTypes = getResultTypes()
+    states = {0: {}}
+    work = [0]
+
+    while work:
+        index = work.pop()
+        state = dict(states[index])
+
+        while True:
+            opcodeId, arguments, order = program[index]
+            inferInstruction(state, names[opcodeId], arguments, resultTypes)
+            if index in branches or index + 1 in leaders:
+                break
+            index = index + 1
+
+        for target in branches.get(index, [index + 1]):
+            if target == len(program):
+                continue
+
+            merged = mergeStates(states.get(target), state)
+            if merged is not None:
+                states[target] = merged
+                work.append(target)
+
+    return states
+
+
+# Return opcode name => (operation, operand types) of the instructions that have specialized handlers
+def getSpecializations():
+    number = TYPE_INT
+    comparable = TYPE_INT | TYPE_BOOL
+    return {
+        "add": (operator.add, number), "sub": (operator.sub, number), "mul": (operator.mul, number),
+        "lt": (operator.lt, comparable), "gt": (operator.gt, comparable), "eq": (operator.eq, comparable),
+        "and": (operator.and_, TYPE_BOOL), "or": (operator.or_, TYPE_BOOL), "not": (operator.not_, TYPE_BOOL),
+        "jumpifeq": (operator.eq, comparable), "jumpifneq": (operator.ne, comparable),
+        "addjump": (operator.add, number), "subjump": (operator.sub, number),
+        "ltjump": (operator.lt, comparable), "gtjump": (operator.gt, comparable), "eqjump": (operator.eq, comparable)
+    }
+
+
+# Return the specialized record of the instruction, None if the types of its operands are not proven
+# Symbols have to be constants or GF variables holding always the same int or bool type, strings
+# may be kept in a StringBuffer and are left to the generic handlers
+def specializeInstruction(instruction, opcode, state, variables, opcodeIds, specializations):
+    opcodeId, arguments, order = instruction
+    if opcode not in specializations:
+        return None
+
+    op, allowedTypes = specializations[opcode]
+    symbs = arguments[1:2] if opcode == "not" else arguments[1:3]
+    symbTypes = set(getSymbType(state, symb) for symb in symbs)
+    if len(symbTypes) != 1:
+        return None
+
+    symbType = symbTypes.pop()
+    if (symbType != TYPE_INT and symbType != TYPE_BOOL) or not symbType & allowedTypes:
+        return None
+
+    operands = tuple(((symb[1],), 0) if symb[0] == CONST else (variables, symb[1]) for symb in symbs)
+
+    if opcode == "jumpifeq" or opcode == "jumpifneq":
+        return (opcodeIds["typedbranch"], (arguments[0][1],) + operands + (op,), order)
+
+    # the result is stored to a defined GF variable
+    result = arguments[0]
+    if result[0] != 0 or state.get(result[1], TYPE_UNDEFINED) & TYPE_UNDEFINED:
+        return None
+
+    result = (variables, result[1])
+    if opcode == "not":
+        return (opcodeIds["typednot"], (result,) + operands, order)
+    elif opcode == "addjump" or opcode == "subjump":
+        return (opcodeIds["typedoperationjump"], (result,) + operands + (op, arguments[3][1]), order)
+    elif opcode in ("ltjump", "gtjump", "eqjump"):
+        arguments = (result,) + operands + (op, arguments[3][1], arguments[4][1])
+        return (opcodeIds["typedcomparejump"], arguments, order)
+
+    return (opcodeIds["typedoperation"], (result,) + operands + (op,), order)
+
+
+# Replace instructions whose operand types are proven by the inference by specialized handlers
+# without runtime checks, the program has resolved labels and GF are the global variables it runs with
+# Instructions that may fail on a type keep the generic handlers and fail at the same place
+def specializeInstructions(program, GF):
+    if not program:
+        return program
+
+    opcodeIds = getOpcodeIds()
+    names = list(opcodeIds)
+    resultTypes = getResultTypes()
+    specializations = getSpecializations()
+    branches, leaders = getBasicBlocks(program, names)
+    states = inferTypes(program, names, branches, leaders)
+
+    specialized = list(program)
+    for index, state in states.items():
+        state = dict(state)
+
+        while True:
+            opcodeId, arguments, order = program[index]
+            record = specializeInstruction(program[index], names[opcodeId], state, GF.variables,
+                                           opcodeIds, specializations)
+            if record is not None:
+                specialized[index] = record
+
+            inferInstruction(state, names[opcodeId], arguments, resultTypes)
+            if index in branches or index + 1 in leaders:
+                break
+            index = index + 1
+
+    return specialized
+
+
+# Execute pre-decoded instructions
+def runInstructions(program, ctx, handlers):
+    index = 0
+    programLength = len(program)
+
+    while index < programLength:
+        instruction = program[index]
+        index = handlers[instruction[0]](ctx, instruction[1], index)
+
+
+########################################### COMPILER ###############################################
+# Return the Python expressions of the operations of specialized instructions
+def getOperatorSources():
+    return {
+        operator.add: "{} + {}", operator.sub: "{} - {}", operator.mul: "{} * {}",
+        operator.lt: "{} < {}", operator.gt: "{} > {}", operator.eq: "{} == {}", operator.ne: "{} != {}",
+        operator.and_: "{} & {}", operator.or_: "{} | {}", operator.not_: "not {}"
+    }
+
+
+# Return the Python expression of a (values, key) operand of a specialized instruction,
+# constants are inlined and GF variables are items of the gf list
+def getOperandSource(operand):
+    values, key = operand
+    if type(values) is tuple:
+        return repr(values[key])
+
+    return "gf[{}]".format(key)
+
+
+# Return the lines storing value to the GF variable of a specialized instruction,
+# its first value goes through assignToVar like in the specialized handlers
+def getStoreSource(result):
+    return ["if gf[{}] is None:".format(result[1]),
+            "    assignToVar(ctx, (0, {}), value)".format(result[1]),
+            "else:",
+            "    gf[{}] = value".format(result[1])]
+
+
+# Return the statement transferring control to the block starting at target
+def getJumpSource(target, start):
+    if target == start:
+        return "continue"
+
+    return "return {}".format(target)
+
+
+# Return the lines leaving the block by the jump, when instructions are counted
+# the count of the block up to the jump is added first
+def getExitSource(jump, executed):
+    if executed is None:
+        return [jump]
+
+    return ["ctx.executedInstructions += {}".format(executed), jump]
+
+
+# Return the lines of the Python function of the basic block from start to end with the count of
+# instructions executed up to every line, None if instructions are not counted, the function
+# returns the start of the next block, a jump back to its own start loops inside the function
+# Specialized instructions become inline Python, the others call their handlers with constant operands
+def compileBlock(program, start, end, names, handlers, branches, weights, namespace):
+    operators = getOperatorSources()
+    lines = []
+    executed = 0 if weights is not None else None
+
+    for index in range(start, end):
+        opcodeId, arguments, order = program[index]
+        opcode = names[opcodeId]
+        code = []
+        if executed is not None:
+            executed = executed + weights[opcodeId]
+
+        if opcode == "label":
+            continue
+
+        elif opcode == "typedoperation":
+            result, symb, symb2, op = arguments
+            code.append("value = " + operators[op].format(getOperandSource(symb), getOperandSource(symb2)))
+            code.extend(getStoreSource(result))
+
+        elif opcode == "typednot":
+            result, symb = arguments
+            code.append("value = not " + getOperandSource(symb))
+            code.extend(getStoreSource(result))
+
+        elif opcode == "typedbranch":
+            target, symb, symb2, op = arguments
+            code.append("if " + operators[op].format(getOperandSource(symb), getOperandSource(symb2)) + ":")
+            code.extend("    " + line for line in getExitSource(getJumpSource(target, start), executed))
+
+        elif opcode == "typedoperationjump":
+            result, symb, symb2, op, target = arguments
+            code.append("value = " + operators[op].format(getOperandSource(symb), getOperandSource(symb2)))
+            code.extend(getStoreSource(result))
+            code.extend(getExitSource(getJumpSource(target, start), executed))
+
+        elif opcode == "typedcomparejump":
+            result, symb, symb2, op, target, jumpWhen = arguments
+            code.append("value = " + operators[op].format(getOperandSource(symb), getOperandSource(symb2)))
+            code.extend(getStoreSource(result))
+            code.append("if value is {}:".format(jumpWhen))
+            code.extend("    " + line for line in getExitSource(getJumpSource(target, start), executed))
+
+        else:
+            name = "arguments{}".format(index)
+            namespace[name] = arguments
+            call = "{}(ctx, {}, {})".format(handlers[opcodeId].__name__, name, index)
+
+            # the handler of the last instruction chooses the next block
+            if index in branches:
+                code.append("index = " + call)
+                code.append("if index != {}:".format(start))
+                code.extend("    " + line for line in getExitSource("return index", executed))
+                code.extend(getExitSource("continue", executed))
+            else:
+                code.append(call)
+
+            # when the handler fails, the jump of a superinstruction has not run
+            if executed is not None:
+                lines.append((code.pop(0), executed - weights[opcodeId] + 1))
+
+        lines.extend((line, executed) for line in code)
+
+    lines.extend((line, executed) for line in getExitSource(getJumpSource(end, start), executed))
+
+    header = [("def block{}(ctx, gf):".format(start), None), ("    while True:", None)]
+    return header + [("        " + line, executed) for line, executed in lines]
+
+
+# Translate the program with resolved labels into Python functions of its basic blocks,
+# instructions are counted with the weights if they are given, return the list indexed
+# by instruction index with the function of every block start and the list indexed by
+# line of the source with the count of instructions executed up to the line in its block
+def compileProgram(program, handlers, weights=None):
+    names = list(getOpcodeIds())
+    branches, leaders = getBasicBlocks(program, names)
+    starts = sorted(leaders)
+
+    namespace = {handler.__name__: handler for handler in handlers}
+    namespace["assignToVar"] = assignToVar
+
+    lines = []
+    for start, end in zip(starts, starts[1:]):
+        lines.extend(compileBlock(program, start, end, names, handlers, branches, weights, namespace))
+
+    source = "\n".join(line for line, executed in lines)
+    exec(compile(source, "<IPPcode19>", "exec"), namespace)
+
+    blocks = [None] * (len(program) + 1)
+    for start in starts[:-1]:
+        blocks[start] = namespace["block{}".format(start)]
+
+    # line numbers start at 1
+    return blocks, [None] + [executed for line, executed in lines]
+
+
+# Execute the program compiled to Python functions of its basic blocks, the output and the exit
+# codes are the same as of runInstructions, counted instructions are the same as of countInstructions
+def runCompiled(program, ctx, handlers, counting=False):
+    weights = getInstructionWeights() if counting else None
+    blocks, lineCounts = compileProgram(program, handlers, weights)
+    variables = ctx.GF.variables
+
+    index = 0
+    programLength = len(program)
+
+    try:
+        while index < programLength:
+            index = blocks[index](ctx, variables)
+    except BaseException:
+        # the block that ended by EXIT or an error counts up to the line it stopped at
+        if counting:
+            traceback = sys.exc_info()[2]
+            while traceback is not None and traceback.tb_frame.f_code.co_filename != "<IPPcode19>":
+                traceback = traceback.tb_next
+            if traceback is not None:
+                ctx.executedInstructions += lineCounts[traceback.tb_lineno]
+        raise
+
+
+########################################### PROFILER ###############################################
+# Execute pre-decoded instructions measuring the count and the time of every instruction,
+# the report is written also when the program ends by EXIT or by an error
+def profileInstructions(program, ctx, handlers, profileFile):
+    import time
+    index = 0
+    current = 0
+    start = None
+
+    counts = [0] * len(program)
+    times = [0.0] * len(program)
+    clock = time.perf_counter
+    programLength = len(program)
+
+    try:
+        while index < programLength:
+            current = index
+            instruction = program[current]
+            counts[current] += 1
+            start = clock()
+            index = handlers[instruction[0]](ctx, instruction[1], current)
+            times[current] += clock() - start
+            start = None
+    finally:
+        if start is not None:
+            times[current] += clock() - start
+        ctx.output.flush()
+        writeProfile(program, counts, times, profileFile)
+
+
+# Aggregate the measurements per opcode and per instruction, the most expensive first
+def getProfile(program, counts, times):
+    names = {opcodeId: name for name, opcodeId in getOpcodeIds().items()}
+
+    opcodes = {}
+    instructions = []
+    for index, (opcodeId, arguments, order) in enumerate(program):
+        if counts[index] == 0:
+            continue
+
+        name = names[opcodeId].upper()
+        entry = opcodes.setdefault(name, {"opcode": name, "count": 0, "time": 0.0})
+        entry["count"] += counts[index]
+        entry["time"] += times[index]
+
+        instructions.append({"order": order, "opcode": name, "count": counts[index], "time": times[index]})
+
+    opcodes = sorted(opcodes.values(), key=lambda entry: (-entry["time"], -entry["count"]))
+    instructions.sort(key=lambda entry: (-entry["time"], -entry["count"], entry["order"]))
+
+    return {"count": sum(counts), "time": sum(times), "opcodes": opcodes, "instructions": instructions}
+
+
+# Write the profile as text report to the file and as JSON to the file with .json suffix
+def writeProfile(program, counts, times, profileFile):
+    import json
+    profile = getProfile(program, counts, times)
+    total = profile["time"] or 1.0
+
+    lines = ["Executed instructions: {}".format(profile["count"]),
+             "Total time: {:.6f} s".format(profile["time"]),
+             "",
+             "{:<14}{:>12}{:>14}{:>9}".format("OPCODE", "COUNT", "TIME [s]", "TIME %")]
+    for entry in profile["opcodes"]:
+        lines.append("{:<14}{:>12}{:>14.6f}{:>8.2f}%".format(entry["opcode"], entry["count"],
+                                                             entry["time"], 100 * entry["time"] / total))
+
+    lines = lines + ["", "{:<10}{:<14}{:>12}{:>14}{:>9}".format("ORDER", "OPCODE", "COUNT", "TIME [s]", "TIME %")]
+    for entry in profile["instructions"]:
+        lines.append("{:<10}{:<14}{:>12}{:>14.6f}{:>8.2f}%".format(entry["order"], entry["opcode"], entry["count"],
+                                                                   entry["time"], 100 * entry["time"] / total))
+
+    try:
+        with open(profileFile, "w") as report:
+            report.write("\n".join(lines) + "\n")
+        with open(profileFile + ".json", "w") as report:
+            json.dump(profile, report, indent=2)
+    except OSError:
+        terminate("Can not write profile to {}!".format(profileFile), 12)
+
+
+# Execute pre-decoded instructions attributing the instruction count and the time to the
+# stack of labels entered by CALL, every distinct stack is a node of the call tree,
+# direct recursion stays in the node of the label so deep recursion keeps the tree small
+def profileCalls(program, ctx, handlers, profileFile):
+    import time
+    index = 0
+    node = 0
+    nodeStack = []
+
+    opcodeIds = getOpcodeIds()
+    callId = opcodeIds["call"]
+    returnId = opcodeIds["return"]
+
+    # node 0 is the top level of the program
+    labels = ["<program>"]
+    parents = [None]
+    children = {}
+    calls = [0]
+    counts = [0]
+    times = [0.0]
+    clock = time.perf_counter
+    last = clock()
+    programLength = len(program)
+
+    try:
+        while index < programLength:
+            instruction = program[index]
+            counts[node] += 1
+            index = handlers[instruction[0]](ctx, instruction[1], index)
+
+            # the time is measured only when the stack of labels changes
+            if instruction[0] == callId:
+                now = clock()
+                times[node] += now - last
+                last = now
+
+                # the operand is the index of the LABEL instruction, its operand is the name
+                label = program[instruction[1][0][1]][1][0][1]
+                child = node if label == labels[node] else children.get((node, label))
+                if child is None:
+                    child = len(labels)
+                    children[(node, label)] = child
+                    labels.append(label)
+                    parents.append(node)
+                    calls.append(0)
+                    counts.append(0)
+                    times.append(0.0)
+
+                calls[child] += 1
+                nodeStack.append(node)
+                node = child
+            elif instruction[0] == returnId:
+                now = clock()
+                times[node] += now - last
+                last = now
+
+                node = nodeStack.pop()
+    finally:
+        times[node] += clock() - last
+        ctx.output.flush()
+        writeCallProfile(labels, parents, calls, counts, times, profileFile)
+
+
+# Sum the call tree per label, exclusive of callees and inclusive of them,
+# a recursive label is counted once per stack
+def getCallProfile(labels, parents, calls, counts, times):
+    entries = {}
+    callers = []
+    for node, label in enumerate(labels):
+        # a node is created after its parent, recursion shares the set of its caller
+        parent = parents[node]
+        if parent is None:
+            callers.append(frozenset((label,)))
+        elif label in callers[parent]:
+            callers.append(callers[parent])
+        else:
+            callers.append(callers[parent] | {label})
+
+        entry = entries.setdefault(label, {"label": label, "calls": 0,
+                                           "inclusiveCount": 0, "inclusiveTime": 0.0,
+                                           "exclusiveCount": 0, "exclusiveTime": 0.0})
+        entry["calls"] += calls[node]
+        entry["exclusiveCount"] += counts[node]
+        entry["exclusiveTime"] += times[node]
+
+        for caller in callers[node]:
+            entries[caller]["inclusiveCount"] += counts[node]
+            entries[caller]["inclusiveTime"] += times[node]
+
+    entries = sorted(entries.values(), key=lambda entry: (-entry["inclusiveTime"], entry["label"]))
+
+    return {"count": sum(counts), "time": sum(times), "labels": entries}
+
+
+# Write the call tree as collapsed stacks "label;label;label weight", the stack of
+# labels is built by walking the tree depth first instead of storing it for every node
+def writeCollapsedStacks(report, labels, parents, weights):
+    children = [[] for label in labels]
+    for node in range(len(labels) - 1, 0, -1):
+        children[parents[node]].append(node)
+
+    path = []
+    pending = [0]
+    while pending:
+        node = pending.pop()
+        if node is None:
+            path.pop()
+            continue
+
+        path.append(labels[node])
+        if weights[node]:
+            report.write("{} {}\n".format(";".join(path), weights[node]))
+
+        pending.append(None)
+        pending.extend(children[node])
+
+
+# Write collapsed stacks weighted by instruction count to the file and by time in microseconds
+# to the file with .time suffix, totals per label as JSON to the file with .json suffix
+def writeCallProfile(labels, parents, calls, counts, times, profileFile):
+    import json
+    profile = getCallProfile(labels, parents, calls, counts, times)
+
+    try:
+        with open(profileFile, "w") as report:
+            writeCollapsedStacks(report, labels, parents, counts)
+        with open(profileFile + ".time", "w") as report:
+            writeCollapsedStacks(report, labels, parents, [round(seconds * 1000000) for seconds in times])
+        with open(profileFile + ".json", "w") as report:
+            json.dump(profile, report, indent=2)
+    except OSError:
+        terminate("Can not write profile to {}!".format(profileFile), 12)
+
+
+########################################## STATISTICS ##############################################
+# Return the statistics counters in the order of the program arguments, a counter can repeat
+def getStatsCounters(arguments):
+    counters = {"--insts": "insts", "--vars": "vars", "--stack-depth": "stackDepth",
+                "--call-depth": "callDepth", "--frame-depth": "frameDepth", "--time": "time"}
+
+    return [counters[argument] for argument in arguments if argument in counters]
+
+
+# Return the number of instructions of the source every opcode id stands for
+def getInstructionWeights():
+    fused = getSuperinstructionList() + ["typedoperationjump", "typedcomparejump"]
+    return [2 if opcode in fused else 1 for opcode in getOpcodeIds()]
+
+
+# Execute pre-decoded instructions counting them, a superinstruction counts as the pair
+# it replaces, the count is kept also when the program ends by EXIT or an error
+# The jump of a superinstruction counts only after its handler returns, it does not run
+# when the first instruction fails
+def countInstructions(program, ctx, handlers):
+    index = 0
+    executed = 0
+
+    fused = [weight - 1 for weight in getInstructionWeights()]
+    programLength = len(program)
+
+    try:
+        while index < programLength:
+            instruction = program[index]
+            executed += 1
+            index = handlers[instruction[0]](ctx, instruction[1], index)
+            executed += fused[instruction[0]]
+    finally:
+        ctx.executedInstructions = executed
+
+
+# Write the requested counters to the statistics file, one value per line,
+# the time runs from the start of loading the program to the end of its execution
+def writeStats(ctx, counters, statsFile, startTime):
+    import time
+    values = {"insts": ctx.executedInstructions, "vars": ctx.varsPeak,
+              "stackDepth": ctx.dataStackPeak, "callDepth": ctx.callDepthPeak,
+              "frameDepth": ctx.frameStackPeak, "time": "{:.6f}".format(time.perf_counter() - startTime)}
+
+    try:
+        with open(statsFile, "w") as f:
+            for counter in counters:
+                f.write("{}\n".format(values[counter]))
+    except OSError:
+        terminate("Can not write statistics to {}!".format(statsFile), 12)
+
+
+# Execute pre-decoded instructions, profile them if a profile file is given and
+# write the statistics if a statistics file is given, profiled programs are not specialized
+def executeInstructions(program, GF, TF, LF, stack, inputReader, output, maxCallDepth,
+                        profileFile=None, callProfileFile=None, statsFile=None, statsCounters=(),
+                        specialize=True, engine="interpret", startTime=0):
+    opcodeIds = getOpcodeIds()
+    program = resolveLabels(program, opcodeIds)
+    if specialize and profileFile is None and callProfileFile is None:
+        program = specializeInstructions(program, GF)
+    ctx = Context(GF, TF, LF, stack, inputReader, output, maxCallDepth)
+    handlers = getHandlerTable()
+
+    # the statistics are written also when the program ends by EXIT or an error
+    try:
+        if profileFile is not None:
+            profileInstructions(program, ctx, handlers, profileFile)
+        elif callProfileFile is not None:
+            profileCalls(program, ctx, handlers, callProfileFile)
+        elif engine == "compile":
+            runCompiled(program, ctx, handlers, statsFile is not None and "insts" in statsCounters)
+        elif statsFile is not None and "insts" in statsCounters:
+            countInstructions(program, ctx, handlers)
+        else:
+            runInstructions(program, ctx, handlers)
+
+        output.flush()
+    finally:
+        if statsFile is not None:
+            writeStats(ctx, statsCounters, statsFile, startTime)
+
+
+# Class for the target of the XML parser, the program is validated in the same pass
+# as it is parsed, every instruction is decoded into (opcode id, operands, order number)
+# at its end tag, no elements are built
+class ProgramBuilder:
+    def __init__(self):
+        self.signatures = getSignatures()
+        self.opcodeIds = getOpcodeIds()
+        self.instructions = []
+        self.slots = ({}, {})
+        self.cache = ({}, {})
+        self.tags = set()
+        self.depth = 0
+        # attributes and arguments of the instruction being read, text of the argument being read
+        self.attributes = None
+        self.arguments = []
+        self.text = None
+
+    def start(self, tag, attributes):
+        self.depth = self.depth + 1
+        if self.depth == 1:
+            checkRoot(tag, attributes)
+
+        elif self.depth == 2:
+            self.attributes = attributes if tag == "instruction" else None
+            self.arguments = []
+
+        elif self.depth == 3 and self.attributes is not None:
+            self.text = []
+            self.arguments.append((tag, attributes, self.text))
+
+        # the text of an argument ends with its first child element
+        else:
+            self.text = None
+
+    def data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+    def end(self, tag):
+        if self.depth == 3:
+            self.text = None
+
+        elif self.depth == 2 and self.attributes is not None:
+            arguments = [(argTag, attributes, "".join(text) if text else None)
+                         for argTag, attributes, text in self.arguments]
+            self.instructions.append(decodeInstruction(self.attributes, arguments, self))
+            self.attributes = None
+
+        self.depth = self.depth - 1
+
+    def close(self):
+        return self.instructions
+
+
+# Validate instruction and decode it into (opcode id, operands, order number),
+# arguments are (tag, attributes, text)
+def decodeInstruction(attributes, arguments, builder):
+    items = list(attributes.items())
+    order = checkInstructionAttributes(items)
+
+    opcode = items[1][1].lower()
+    signature = builder.signatures.get(opcode)
+    if signature is None:
+        terminate("Instruction not found!", 32)
+
+    tokens = checkArgumentAttributes(arguments, builder.tags)
+    tokens = sortArguments(tokens)
+
+    operands = decodeArguments(signature, tokens, builder.slots, builder.cache)
+    return (builder.opcodeIds[opcode], operands, order)
+
+
+# Load the program from XML source, decode it into (opcode id, operands, order number) records,
+# return the program and the number of GF variable slots
+# The source is read in blocks and validated by ProgramBuilder while it is parsed,
+# so neither the tree nor the whole source is ever in memory
+def prepareInstructions(source, blockSize=65536):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return prepareInstructions(f, blockSize)
+
+    builder = ProgramBuilder()
+    parser = ET.XMLParser(target=builder)
+
+    try:
+        block = source.read(blockSize)
+        while block:
+            parser.feed(block)
+            block = source.read(blockSize)
+
+        instructions = parser.close()
+    except ET.ParseError:
+        terminate("Wrong XML format!", 31)
+
+    program = sortInstructions(instructions)
+    opcodeIds = builder.opcodeIds
+    slots = builder.slots
+
+    # BREAK reports the instruction number, keep it with the instruction
+    breakId = opcodeIds["break"]
+    for index, (opcodeId, arguments, order) in enumerate(program):
+        if opcodeId == breakId:
+            program[index] = (opcodeId, ((CONST, index + 1),), order)
+
+    return program, len(slots[0])
+
+
+# Return bytes identifying the interpreter build, programs cached by other builds are not used
+def getInterpreterVersion():
+    with open(os.path.abspath(__file__), "rb") as f:
+        return f.read() + sys.version.encode()
+
+
+# Replace nil operands of the given records, nil is stored as None in the cache file
+def replaceNil(program, records, old, new):
+    for index in records:
+        opcodeId, arguments, order = program[index]
+        arguments = tuple((CONST, new) if operand[0] == CONST and operand[1] is old else operand
+                          for operand in arguments)
+        program[index] = (opcodeId, arguments, order)
+
+
+# Load the program through the cache directory, the validated and decoded program is
+# stored under the hash of the interpreter build and the source, later runs skip parsing
+def prepareCachedInstructions(source, cacheDir):
+    import hashlib
+    import marshal
+    data = source.buffer.read() if hasattr(source, "buffer") else source.read().encode()
+
+    key = hashlib.sha256(getInterpreterVersion())
+    key.update(data)
+    cacheFile = os.path.join(cacheDir, key.hexdigest() + ".ippc")
+
+    try:
+        with open(cacheFile, "rb") as f:
+            program, globalSlots, nilRecords = marshal.load(f)
+
+        replaceNil(program, nilRecords, None, nil)
+        return program, globalSlots
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    program, globalSlots = prepareInstructions(io.BytesIO(data))
+
+    # the cache is best effort, the program runs even if it can not be stored
+    nilRecords = [index for index, (opcodeId, arguments, order) in enumerate(program)
+                  if any(operand[0] == CONST and operand[1] is nil for operand in arguments)]
+    cached = list(program)
+    replaceNil(cached, nilRecords, nil, None)
+
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmpFile = "{}.{}.tmp".format(cacheFile, os.getpid())
+        with open(tmpFile, "wb") as f:
+            marshal.dump((cached, globalSlots, nilRecords), f)
+        os.replace(tmpFile, cacheFile)
+    except OSError:
+        pass
+
+    return program, globalSlots
+
+
+
+############################################## SERVER ##############################################
+# Load and execute one program, EXIT and errors end it by SystemExit with the exit code
+def runProgram(args, parseSource, inputFile, statsCounters=()):
+    import time
+    startTime = time.perf_counter()
+
+    # parse and process instructions from XML
+    if args.cache_dir:
+        program, globalSlots = prepareCachedInstructions(parseSource, args.cache_dir)
+    else:
+        program, globalSlots = prepareInstructions(parseSource)
+
+    if args.optimize:
+        program = optimizeProgram(program)
+
+    # profiles report the instructions of the source, superinstructions would hide them
+    profiling = args.profile is not None or args.profile_calls is not None
+    if not args.no_fusion and not profiling:
+        program = fuseInstructions(program)
+
+    # create frames and the frame stack
+    stack = []
+    GF = Frames(globalSlots)
+    LF = Frames()
+    TF = Frames()
+
+    GF.init = True 
+
+    # WRITE output goes through the buffer, terminate flushes it through sys.stdout
+    output = OutputWriter(sys.stdout, args.output_buffer)
+    sys.stdout = output
+
+    executeInstructions(program, GF, TF, LF, stack, InputReader(inputFile), output, args.max_call_depth,
+                        args.profile, args.profile_calls, args.stats, statsCounters, not args.no_specialize, args.engine,
+                        startTime)
+
+
+# Options of a job, a job may override the limits and switches the server was started with
+def getJobArguments(job, defaults):
+    args = Arguments(**vars(defaults))
+    args.max_call_depth = job.get("maxCallDepth", args.max_call_depth)
+    args.output_buffer = job.get("outputBuffer", args.output_buffer)
+    args.optimize = job.get("optimize", args.optimize)
+    args.no_fusion = not job.get("fusion", not args.no_fusion)
+    args.no_specialize = not job.get("specialize", not args.no_specialize)
+    args.engine = job.get("engine", args.engine)
+    checkLimits(args)
+
+    # the reports of the command line mode would be overwritten by every job
+    args.profile = args.profile_calls = args.stats = None
+
+    return args
+
+
+# End the job when its time limit runs out
+def timeLimitExceeded(signum, frame):
+    terminate("Time limit exceeded!", 99)
+
+
+# Raised by SIGTERM to stop the server, it is not a SystemExit or an Exception
+# so a running job does not catch it
+class ServerShutdown(BaseException):
+    pass
+
+
+def shutdownServer(signum, frame):
+    raise ServerShutdown()
+
+
+# Run one job in isolation with its own frames, stacks and output,
+# return the response with captured stdout, stderr and the exit code
+def runJob(job, defaults):
+    import signal
+    import traceback
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    streams = (sys.stdout, sys.stderr)
+    sys.stdout = stdout
+    sys.stderr = stderr
+    files = []
+    returnCode = 0
+
+    try:
+        args = getJobArguments(job, defaults)
+
+        if "xml" in job:
+            parseSource = io.StringIO(job["xml"])
+        elif "source" in job:
+            parseSource = open(job["source"])
+            files.append(parseSource)
+        else:
+            terminate("Job without source!", 10)
+
+        if "inputText" in job:
+            inputFile = io.StringIO(job["inputText"])
+        elif "input" in job:
+            inputFile = open(job["input"])
+            files.append(inputFile)
+        else:
+            inputFile = io.StringIO()
+
+        if job.get("timeout"):
+            signal.signal(signal.SIGALRM, timeLimitExceeded)
+            signal.setitimer(signal.ITIMER_REAL, job["timeout"])
+
+        runProgram(args, parseSource, inputFile)
+    except SystemExit as e:
+        returnCode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except OSError as e:
+        print("ERROR: {}".format(e), file=sys.stderr)
+        returnCode = 11
+    except Exception:
+        traceback.print_exc()
+        returnCode = 99
+    finally:
+        if job.get("timeout"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdout.flush()
+        sys.stdout, sys.stderr = streams
+        for f in files:
+            f.close()
+
+    return {"id": job.get("id"), "returnCode": returnCode,
+            "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+# Read jobs as JSON lines and write a JSON line response for every job
+def serve(jobs, responses, defaults):
+    import json
+    for line in jobs:
+        if not line.strip():
+            continue
+
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("job is not an object")
+        except ValueError as e:
+            response = {"id": None, "returnCode": 10, "stdout": "", "stderr": "ERROR: Wrong job: {}\n".format(e)}
+        else:
+            response = runJob(job, defaults)
+
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+# Serve jobs on a Unix socket, connections are served one after another
+def serveSocket(path, defaults):
+    import signal
+    import socketserver
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            jobs = io.TextIOWrapper(self.rfile, encoding="utf-8")
+            responses = io.TextIOWrapper(self.wfile, encoding="utf-8")
+            serve(jobs, responses, defaults)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    # the socket file is removed also when the server is terminated, even during a job
+    signal.signal(signal.SIGTERM, shutdownServer)
+
+    with socketserver.UnixStreamServer(path, JobHandler) as server:
+        try:
+            server.serve_forever()
+        except ServerShutdown:
+            pass
+        finally:
+            os.remove(path)
+
+
+############################################### MAIN ###############################################
+# Class for parsed program arguments
+class Arguments:
+    def __init__(self, **arguments):
+        self.__dict__.update(arguments)
+
+
+# Check the values of the options the command line and the jobs can set
+def checkLimits(args):
+    for value in (args.max_call_depth, args.output_buffer):
+        if type(value) is not int or value <= 0:
+            terminate("Invalid argument!", 10)
+
+    if args.engine not in getEngines():
+        terminate("Invalid argument!", 10)
+
+
+# Return the names of the execution engines
+def getEngines():
+    return ("interpret", "compile")
+
+
+# Return the default values of the program arguments
+def getDefaultArguments():
+    return {"source": None, "input": None, "max_call_depth": 10000000, "output_buffer": 65536,
+            "cache_dir": None, "optimize": False, "no_fusion": False, "no_specialize": False,
+            "engine": "interpret", "profile": None, "profile_calls": None, "stats": None,
+            "insts": False, "vars": False, "stack_depth": False, "call_depth": False, "frame_depth": False, "time": False,
+            "server": False, "socket": None}
+
+
+# Parse the usual --source=file and --input=file arguments without argparse,
+# return None when the arguments need the full parser
+def parseArgumentsFast(arguments):
+    args = getDefaultArguments()
+
+    for argument in arguments:
+        name, separator, value = argument.partition("=")
+        if name not in ("--source", "--input") or not value or args[name[2:]] is not None:
+            return None
+        args[name[2:]] = value
+
+    # files that can not be opened are reported by argparse
+    files = []
+    try:
+        for name in ("source", "input"):
+            if args[name] is not None:
+                args[name] = open(args[name])
+                files.append(args[name])
+    except OSError:
+        for f in files:
+            f.close()
+        return None
+
+    return Arguments(**args)
+
+
+# Return the parser of the program arguments
+def getArgumentParser():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.set_defaults(**getDefaultArguments())
+    parser.add_argument('--source', help = "XML file", type = argparse.FileType('r'))
+    parser.add_argument('--input', help = "XML file", type = argparse.FileType('r'))
+    parser.add_argument('--max-call-depth', help = "Maximum depth of the call stack", type = int)
+    parser.add_argument('--output-buffer', help = "Size of the output buffer in characters", type = int)
+    parser.add_argument('--cache-dir', help = "Directory for cached decoded programs")
+    parser.add_argument('--optimize', help = "Optimize the program before execution", action = "store_true")
+    parser.add_argument('--no-fusion', help = "Do not fuse instructions into superinstructions", action = "store_true")
+    parser.add_argument('--no-specialize', help = "Do not replace type checked instructions by specialized ones",
+                        action = "store_true")
+    parser.add_argument('--engine', help = "Execute instructions by the interpreter loop or compiled to Python, "
+                        "profiles always use the interpreter loop without fusion and specialization",
+                        choices = getEngines())
+    profiling = parser.add_mutually_exclusive_group()
+    profiling.add_argument('--profile', help = "Write per-opcode and per-instruction profile to the file")
+    profiling.add_argument('--profile-calls', help = "Write collapsed call stacks of CALL labels to the file")
+    profiling.add_argument('--stats', help = "Write the statistics to the file")
+    parser.add_argument('--insts', help = "Statistics: number of executed instructions", action = "store_true")
+    parser.add_argument('--vars', help = "Statistics: peak number of initialized variables", action = "store_true")
+    parser.add_argument('--stack-depth', help = "Statistics: peak depth of the data stack", action = "store_true")
+    parser.add_argument('--call-depth', help = "Statistics: peak depth of the call stack", action = "store_true")
+    parser.add_argument('--frame-depth', help = "Statistics: peak depth of the frame stack", action = "store_true")
+    parser.add_argument('--time', help = "Statistics: seconds of loading and executing the program", action = "store_true")
+    parser.add_argument('--server', help = "Run jobs read as JSON lines from stdin", action = "store_true")
+    parser.add_argument('--socket', help = "Run jobs read as JSON lines from the Unix socket")
+
+    return parser
+
+
+def main():
+
+    if len(sys.argv) <= 1:
+        terminate("Wrong number of arguments!", 10)
+
+    if sys.argv[1] == "--help" or sys.argv[1] == "-h":
+        print("Use arguments --source and --input!")
+        sys.exit(0)
+
+    # parse program arguments
+    args = parseArgumentsFast(sys.argv[1:])
+    if args is None:
+        try:
+            args = getArgumentParser().parse_args()
+        except:
+            sys.exit(10)
+
+    checkLimits(args)
+    sourceFile = args.source
+    inputFile = args.input
+
+    # statistics counters are written in the order of the arguments and only with --stats
+    statsCounters = getStatsCounters(sys.argv[1:])
+    if statsCounters and args.stats is None:
+        terminate("Parameter --stats not found!", 10)
+
+    if args.server or args.socket:
+        if args.socket:
+            serveSocket(args.socket, args)
+        else:
+            serve(sys.stdin, sys.stdout, args)
+        sys.exit(0)
+
+    # choose between stdin and file
+    if sourceFile:
+        parseSource = sourceFile
+    else:
+        parseSource = sys.stdin
+    
+    if inputFile is None:
+        inputFile = sys.stdin
+
+    runProgram(args, parseSource, inputFile, statsCounters)
 
 
 
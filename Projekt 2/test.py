@@ -0,0 +1,317 @@
+import sys
+import os
+import argparse
+import shlex
+import subprocess
+import tempfile
+import importlib.util
+import concurrent.futures
+
+# Test runner for parse.php and interpret.py, the parallel counterpart of test.php
+# Tests are the same .src/.in/.out/.rc files and the report is the same HTML
+
+# Interpreter module loaded in the worker process, False if tests run interpret.py as a process
+interpreter = None
+interpreterDefaults = None
+
+
+# print error msg to stderr, exit with the proper error code
+def terminate(errorMessage, errorCode):
+    print(errorMessage, file=sys.stderr)
+    sys.exit(errorCode)
+
+
+# Check argument combination validity, return the options of the run
+def checkArguments():
+    parser = argparse.ArgumentParser(add_help = False)
+    parser.add_argument('--help', action = "store_true")
+    parser.add_argument('--directory', default = os.getcwd())
+    parser.add_argument('--recursive', action = "store_true")
+    parser.add_argument('--parse-script')
+    parser.add_argument('--int-script')
+    parser.add_argument('--parse-only', action = "store_true")
+    parser.add_argument('--int-only', action = "store_true")
+    parser.add_argument('--jobs', type = int, default = os.cpu_count() or 1)
+    parser.add_argument('--no-in-process', action = "store_true")
+    parser.add_argument('--int-args', default = "")
+
+    try:
+        args = parser.parse_args()
+    except SystemExit:
+        terminate("Invalid argument!", 10)
+
+    if args.help:
+        if len(sys.argv) > 2:
+            terminate("Wrong argument combination!", 10)
+        print("Validne parametry skriptu:\n\n--directory=path\n--recursive\n--parse-script=file\n--int-script=file\n"
+              "--parse-only\n--int-only\n--jobs=count\n--no-in-process\n--int-args=options\n")
+        sys.exit(0)
+
+    if args.parse_only and args.int_only:
+        terminate("Wrong argument combination!", 10)
+
+    if args.int_only and args.parse_script is not None:
+        terminate("Wrong argument combination!", 10)
+
+    if args.parse_only and args.int_script is not None:
+        terminate("Wrong argument combination!", 10)
+
+    args.parse_script = args.parse_script or "./parse.php"
+    args.int_script = args.int_script or "./interpret.py"
+
+    if not os.path.isdir(args.directory):
+        terminate("Directory not found!", 10)
+
+    if not args.int_only and not os.path.isfile(args.parse_script):
+        terminate("File not found!", 10)
+
+    if not args.parse_only and not os.path.isfile(args.int_script):
+        terminate("File not found!", 10)
+
+    if args.jobs < 1:
+        terminate("Invalid argument!", 10)
+
+    args.int_args = shlex.split(args.int_args)
+
+    return args
+
+
+# Search for tests, create missing .in, .out and .rc files,
+# return the paths of tests without extension sorted by directory and name
+def search(directory, recursive):
+    tests = []
+
+    for root, dirs, files in os.walk(os.path.realpath(directory)):
+        if not recursive:
+            dirs[:] = []
+
+        for fileName in files:
+            name, extension = os.path.splitext(fileName)
+            if extension != ".src":
+                continue
+
+            test = os.path.join(root, name)
+            for extension, content in ((".in", ""), (".out", ""), (".rc", "0")):
+                if not os.path.exists(test + extension):
+                    with open(test + extension, "w") as f:
+                        f.write(content)
+
+            tests.append(test)
+
+    tests.sort(key=lambda test: (os.path.dirname(test), os.path.basename(test)))
+    return tests
+
+
+# Load the interpreter into the worker process once, tests then run without starting Python,
+# the extra options of the interpreter become the defaults of its jobs
+def loadInterpreter(intScript, intArgs):
+    global interpreter
+    global interpreterDefaults
+
+    if interpreter is not None:
+        return interpreter
+
+    interpreter = False
+    try:
+        spec = importlib.util.spec_from_file_location("interpret", intScript)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception:
+        return interpreter
+
+    # interpreters without the job API run as a process
+    if hasattr(module, "runJob") and hasattr(module, "getArgumentParser"):
+        interpreter = module
+        try:
+            interpreterDefaults = module.getArgumentParser().parse_args(intArgs)
+        except SystemExit:
+            interpreter = False
+
+    return interpreter
+
+
+# Run the interpreter on the XML source with the extra options, return its exit code and output
+def interpret(intScript, intArgs, sourceFile, inFile, inProcess):
+    if inProcess and loadInterpreter(intScript, intArgs):
+        response = interpreter.runJob({"source": sourceFile, "input": inFile}, interpreterDefaults)
+        return response["returnCode"], response["stdout"].encode()
+
+    result = subprocess.run([sys.executable, intScript, "--source=" + sourceFile, "--input=" + inFile] + intArgs,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return result.returncode, result.stdout
+
+
+# Run the parser on the IPPcode19 source, return its exit code and output
+def parse(parseScript, srcFile):
+    with open(srcFile, "rb") as source:
+        result = subprocess.run(["php7.3", parseScript], stdin=source,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    return result.returncode, result.stdout
+
+
+# Compare XML output of the parser with the expected one by JExamXML
+def compareXml(outFile, output, tmpDir):
+    tmpFile = os.path.join(tmpDir, "parse.xml")
+    with open(tmpFile, "wb") as f:
+        f.write(output)
+
+    result = subprocess.run(["java", "-jar", "/pub/courses/ipp/jexamxml/jexamxml.jar", outFile, tmpFile],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return result.returncode == 0
+
+
+# Run one test, every test has its own temporary directory, return whether it passed
+def runTest(test, parseScript, intScript, intArgs, parseOnly, intOnly, inProcess):
+    with open(test + ".rc") as f:
+        rcVal = int(f.readline().strip() or 0)
+
+    with open(test + ".out", "rb") as f:
+        expected = f.read()
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        if parseOnly:
+            returnVal, output = parse(parseScript, test + ".src")
+            if returnVal == 0 and rcVal == 0:
+                return compareXml(test + ".out", output, tmpDir)
+            return returnVal == rcVal
+
+        if intOnly:
+            sourceFile = test + ".src"
+        else:
+            returnVal, output = parse(parseScript, test + ".src")
+            sourceFile = os.path.join(tmpDir, "parse.xml")
+            with open(sourceFile, "wb") as f:
+                f.write(output)
+
+        returnVal, output = interpret(intScript, intArgs, sourceFile, test + ".in", inProcess)
+        if returnVal == 0 and rcVal == 0:
+            return output == expected
+        return returnVal == rcVal
+
+
+# Run the tests across the process pool, return the results in the order of the tests
+def testFiles(tests, args):
+    intScript = os.path.abspath(args.int_script)
+    parseScript = os.path.abspath(args.parse_script)
+    inProcess = not args.no_in_process
+
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(runTest, test, parseScript, intScript, args.int_args, args.parse_only, args.int_only, inProcess)
+                   for test in tests]
+
+        return [future.result() for future in futures]
+
+
+# Build the body of the report, the table of tests with the summary
+def generateBody(tests, results):
+    htmlTable = ""
+
+    for testCount, (test, passed) in enumerate(zip(tests, results), 1):
+        htmlTable = htmlTable + """
+                    <tr>
+                        <td>""" + str(testCount) + """</td>
+                        <td>""" + os.path.basename(test) + """</td>
+                        <td """
+        if passed:
+            htmlTable = htmlTable + "style=\"color:green\"> SUCCEEDED"
+        else:
+            htmlTable = htmlTable + "style=\"color:red\"> FAILED"
+
+        htmlTable = htmlTable + """
+                        </td>
+                    </tr>
+                """
+
+    allTests = len(tests)
+    success = sum(results)
+    percentage = success / allTests * 100 if allTests else 0
+
+    htmlBody = """
+            <p>Number of tests: """ + str(allTests) + """</p>
+            <p>Successful tests: """ + str(success) + " ( " + "{:.14g}".format(percentage) + """ % )</p>
+        """ + htmlTable
+
+    return htmlBody
+
+
+# Generate html head and end
+def generateHtml():
+    start = """
+            <!doctype html>
+                <html lang="en">
+
+                <head>
+                    <meta charset="utf-8">
+                    <title>IPPcode19 Test</title>
+                    <meta name="description" content="Test results for IPPcode19 test script">
+                    <meta name="author" content="Adam Abraham <xabrah04>">
+                </head>
+                <style>
+                    .content {
+                        text-align: center;
+                        max-width: 800px;
+                        margin: auto;
+                        background: white;
+                        padding: 10px;
+                    }
+
+                    p {
+                        text-align: left;
+                        font-size: 20px;
+                        font-weight: bold;
+                    }
+
+                    table, th, td{
+                        border: 1px solid black;
+                    }
+
+                    th, td {
+                        text-align: center;
+                    }
+                    th {
+                        font-size: 24px;
+                    }
+                    td {
+                        font-size: 20px;
+                    }
+                </style>
+                <body>
+                    <div class="content">
+                        <h1>IPPcode19 Test Summary</h1>
+                        <br>
+
+                        <table style="width:100%">
+                            <tr>
+                                <th>Number</th>
+                                <th>Test name</th>
+                                <th>Result</th>
+                            </tr>
+            """
+
+    end = """
+                        </table>
+                    </div>
+                </body>
+            </html>
+        """
+
+    return start, end
+
+
+def main():
+    args = checkArguments()
+
+    # Search for tests
+    tests = search(args.directory, args.recursive)
+
+    # Execute tests
+    results = testFiles(tests, args)
+
+    # Print out html result
+    start, end = generateHtml()
+    print(start + generateBody(tests, results) + end)
+
+
+if __name__ == "__main__":
+    main()